@@ -0,0 +1,34 @@
+"""
+  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+  
+  Licensed under the Apache License, Version 2.0 (the "License").
+  You may not use this file except in compliance with the License.
+  You may obtain a copy of the License at
+  
+      http://www.apache.org/licenses/LICENSE-2.0
+ 
+  Unless required by applicable law or agreed to in writing, software
+  distributed under the License is distributed on an "AS IS" BASIS,
+  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+  See the License for the specific language governing permissions and
+  limitations under the License.
+
+@author iftikhan
+@description: Run once against an existing table after deploying the AccountStatus index, so records written
+  without a numeric AccountStatus are indexed too.
+"""
+
+import logging
+
+from constant import Constant
+from util import backfill_account_status
+
+logger = logging.getLogger(__name__)
+logger.setLevel(getattr(logging, Constant.LOG_LEVEL))
+
+# set these data before running
+DYNAMODB_TABLE_NAME = Constant.DB_TABLE
+
+
+if __name__ == "__main__":
+    backfill_account_status(table=DYNAMODB_TABLE_NAME)
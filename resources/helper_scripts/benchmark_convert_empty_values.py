@@ -0,0 +1,105 @@
+"""
+  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+  Licensed under the Apache License, Version 2.0 (the "License").
+  You may not use this file except in compliance with the License.
+  You may obtain a copy of the License at
+
+      http://www.apache.org/licenses/LICENSE-2.0
+
+  Unless required by applicable law or agreed to in writing, software
+  distributed under the License is distributed on an "AS IS" BASIS,
+  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+  See the License for the specific language governing permissions and
+  limitations under the License.
+
+@author iftikhan
+@description: Micro-benchmark of utils.dynamodb.convert_empty_values against the previous recursive implementation.
+  Run from the src folder: python ../resources/helper_scripts/benchmark_convert_empty_values.py [rows]
+"""
+
+import sys
+import time
+from copy import deepcopy
+
+from utils.dynamodb import convert_empty_values
+
+
+def legacy_convert_empty_values(d):
+    for k in d:
+        if isinstance(d[k], dict):
+            legacy_convert_empty_values(d[k])
+        elif isinstance(d[k], list):
+            for i in d[k]:
+                if isinstance(i, list) or isinstance(i, dict):
+                    legacy_convert_empty_values(i)
+        elif d[k] == "":
+            d[k] = None
+    return d
+
+
+def account_row(index, empty=False):
+    return {
+        "CompanyName": "Xyz",
+        "AccountId": str(index).zfill(12),
+        "AccountName": f"account-{index}",
+        "AccountEmail": f"account-{index}@example.com",
+        "AccountType": "Linked",
+        "AdminRole": "OrganizationAccountAccessRole",
+        "SlackHandle": "" if empty else "@owner",
+        "Migrate": True,
+        "Tags": "" if empty else "env=prod",
+        "AccountStatus": 0,
+    }
+
+
+def permissions_row(index, resources=50, empty=True):
+    row = account_row(index)
+    row["OrgLevelPermissions"] = {
+        f"arn:aws:s3:::bucket-{index}-{r}": {
+            "Region": "us-east-1",
+            "ResourceType": "AWS::S3::Bucket",
+            "Principal": {"AWS": "o-abcdefghij"},
+            "Condition": "" if empty else "aws:PrincipalOrgID",
+            "Actions": ["s3:GetObject", "s3:PutObject"],
+        }
+        for r in range(resources)
+    }
+    return row
+
+
+def timed(fn, rows, copy_rows):
+    # Note: The legacy function mutates its input, every run gets a fresh copy prepared outside of the timer.
+    rows = deepcopy(rows) if copy_rows else rows
+    start = time.perf_counter()
+    for row in rows:
+        fn(row)
+    return time.perf_counter() - start
+
+
+def run(name, rows):
+    legacy = timed(legacy_convert_empty_values, rows, copy_rows=True)
+    # Note: What callers had to pay to keep their record untouched with the legacy function.
+    legacy_copy = timed(
+        lambda row: legacy_convert_empty_values(deepcopy(row)), rows, copy_rows=False
+    )
+    current = timed(convert_empty_values, rows, copy_rows=False)
+    print(
+        f"{name:<30} rows {len(rows):>6} | legacy {len(rows) / legacy:>10,.0f} rows/s "
+        f"| legacy+deepcopy {len(rows) / legacy_copy:>10,.0f} rows/s "
+        f"| current {len(rows) / current:>10,.0f} rows/s"
+    )
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    run("flat, no empty values", [account_row(i) for i in range(count)])
+    run("flat, empty values", [account_row(i, empty=True) for i in range(count)])
+    run(
+        "nested, no empty values",
+        [permissions_row(i, empty=False) for i in range(max(count // 50, 1))],
+    )
+    run(
+        "nested, empty values",
+        [permissions_row(i) for i in range(max(count // 50, 1))],
+    )
@@ -0,0 +1,94 @@
+"""
+  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+  Licensed under the Apache License, Version 2.0 (the "License").
+  You may not use this file except in compliance with the License.
+  You may obtain a copy of the License at
+
+      http://www.apache.org/licenses/LICENSE-2.0
+
+  Unless required by applicable law or agreed to in writing, software
+  distributed under the License is distributed on an "AS IS" BASIS,
+  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+  See the License for the specific language governing permissions and
+  limitations under the License.
+
+@author iftikhan
+@description: Import time of every Lambda entry point of template.yaml measured with python -X importtime, exits
+  with 1 when an entry point goes over its budget. Run from the src folder:
+  python ../resources/helper_scripts/benchmark_import_time.py [runs] [module=budget_ms ...]
+
+  Total is the cold import of the handler module. Own excludes boto3/botocore, which every entry point needs and the
+  Lambda runtime ships, so it is the part under our control and the one checked against the budget.
+"""
+
+import os
+import re
+import subprocess
+import sys
+
+TEMPLATE = os.path.join(os.path.dirname(__file__), "..", "..", "template.yaml")
+
+# Preloaded before the entry point to measure its Own import time
+RUNTIME_MODULES = "import boto3.session, botocore.config, botocore.credentials"
+
+DEFAULT_BUDGET_MS = 30
+# Entry points allowed more than the default budget
+BUDGETS_MS = {}
+
+
+def get_entry_points() -> list:
+    with open(TEMPLATE) as template:
+        return sorted(
+            set(re.findall(r'Handler:\s*"?(\w+)\.lambda_handler', template.read()))
+        )
+
+
+def import_time_ms(module: str, preload: str = None) -> float:
+    """Returns the cumulative import time of the module in a fresh interpreter."""
+
+    code = f"{preload}; import {module}" if preload else f"import {module}"
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        env={**os.environ, "PYTHONPATH": os.getcwd()},
+    )
+    if result.returncode:
+        raise Exception(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        fields = line.split("|")
+        if len(fields) == 3 and fields[2].strip() == module and fields[2][1] != " ":
+            return int(fields[1]) / 1000
+    raise Exception(f"No import time reported for {module}")
+
+
+def benchmark(runs: int, budgets: dict) -> list:
+    """Returns the entry points over budget, the best of runs is kept to filter out noise."""
+
+    over_budget = []
+    print(f"{'Entry point':<32}{'Total ms':>10}{'Own ms':>10}{'Budget ms':>11}")
+    for module in get_entry_points():
+        total = min(import_time_ms(module) for _ in range(runs))
+        own = min(import_time_ms(module, RUNTIME_MODULES) for _ in range(runs))
+        budget = budgets.get(module, DEFAULT_BUDGET_MS)
+        status = "" if own <= budget else "  OVER BUDGET"
+        print(f"{module:<32}{total:>10.1f}{own:>10.1f}{budget:>11}{status}")
+        if status:
+            over_budget.append(module)
+    return over_budget
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    runs = int(args.pop(0)) if args and args[0].isdigit() else 3
+    budgets = dict(BUDGETS_MS)
+    for arg in args:
+        module, budget = arg.split("=")
+        budgets[module] = float(budget)
+
+    over_budget = benchmark(runs, budgets)
+    if over_budget:
+        print(f"Over budget: {over_budget}")
+        sys.exit(1)
@@ -0,0 +1,132 @@
+"""
+  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+  Licensed under the Apache License, Version 2.0 (the "License").
+  You may not use this file except in compliance with the License.
+  You may obtain a copy of the License at
+
+      http://www.apache.org/licenses/LICENSE-2.0
+
+  Unless required by applicable law or agreed to in writing, software
+  distributed under the License is distributed on an "AS IS" BASIS,
+  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+  See the License for the specific language governing permissions and
+  limitations under the License.
+
+@author iftikhan
+@description: Benchmark of utils.data.process_xls against the previous cell by cell parser on a synthetic workbook.
+  Run from the src folder: python ../resources/helper_scripts/benchmark_process_xls.py [rows]
+"""
+
+import io
+import sys
+import time
+import tracemalloc
+
+import xlwt
+from xlrd.book import open_workbook_xls
+
+from utils.data import process_xls
+
+HEADER = [
+    "CompanyName",
+    "AccountId",
+    "Migrate",
+    "AccountName",
+    "AccountType",
+    "AdminRole",
+    "Environment",
+    "OwnerEmail",
+    "Tags",
+]
+
+
+def legacy_process_xls(xls: bytes):
+    workbook = open_workbook_xls(file_contents=xls)
+    worksheet = workbook.sheet_by_index(0)
+    first_row = [worksheet.cell_value(0, col) for col in range(worksheet.ncols)]
+
+    account_info_list = []
+    for row in range(1, worksheet.nrows):
+        account_info = dict({})
+        for col in range(worksheet.ncols):
+            key = first_row[col]
+            value = worksheet.cell_value(row, col)
+            if type(value) is float:
+                value = str(int(value))
+            elif type(value) is not str:
+                value = str(value)
+
+            if key == "AccountId":
+                value = value.zfill(12)
+
+            if key == "Migrate":
+                if value.lower() in ["true", "1"]:
+                    value = True
+                else:
+                    value = False
+
+            account_info[key] = value
+        account_info_list.append(account_info)
+
+    return account_info_list
+
+
+def generate_workbook(rows: int) -> bytes:
+    """Builds an in memory XLS with the account sheet layout, AccountIds and Migrate flags are numeric cells."""
+
+    workbook = xlwt.Workbook()
+    worksheet = workbook.add_sheet("Accounts")
+    for col, key in enumerate(HEADER):
+        worksheet.write(0, col, key)
+    for row in range(1, rows + 1):
+        values = [
+            "Xyz",
+            float(row),
+            row % 3,
+            f"account-{row}",
+            "Master" if row == 1 else "Linked",
+            "OrganizationAccountAccessRole",
+            "" if row % 5 else "DEV",
+            f"owner-{row}@example.com",
+            "[]",
+        ]
+        for col, value in enumerate(values):
+            worksheet.write(row, col, value)
+    stream = io.BytesIO()
+    workbook.save(stream)
+    return stream.getvalue()
+
+
+def measure(parse, xls: bytes):
+    """Returns (seconds, peak traced MB, rows) to parse the workbook and consume every record.
+
+    Time and memory are measured in separate runs as tracing allocations slows the parser down.
+    """
+
+    start = time.perf_counter()
+    count = sum(1 for _ in parse(xls))
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    for _ in parse(xls):
+        pass
+    peak = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+    tracemalloc.stop()
+    return elapsed, peak, count
+
+
+if __name__ == "__main__":
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    xls = generate_workbook(rows)
+    print(f"Synthetic workbook: {rows} rows, {len(xls) / 1024 / 1024:.1f} MB")
+
+    assert list(process_xls(xls)) == legacy_process_xls(xls), "Parsers disagree"
+
+    start = time.perf_counter()
+    open_workbook_xls(file_contents=xls).sheet_by_index(0)
+    print(f"xlrd workbook open alone: {time.perf_counter() - start:.2f}s")
+
+    for name, parse in [("legacy", legacy_process_xls), ("current", process_xls)]:
+        elapsed, peak, count = measure(parse, xls)
+        print(f"{name:<8} {count} rows in {elapsed:.2f}s, peak memory {peak:.1f} MB")
@@ -24,6 +24,7 @@ from constant import Constant
 from join_organization import get_invitation
 from utils.data import get_account_data
 from utils.dynamodb import get_db
+from utils.ingestion_cache import clear_cache
 from utils.sessions import get_session
 from util import get_accounts_by_company_name
 
@@ -170,6 +171,9 @@ def restore_test_env(company_name, xlspath):
                 logger.info(ce)
             logger.info(f"Successfully clean up {account['AccountId']}")
 
+        # Note: The records are gone, the next load must not skip the file as unchanged.
+        clear_cache(_SHARED_RESOURCE_BUCKET, company_name)
+
     except Exception as ex:
         logger.info(ex)
 
@@ -17,13 +17,23 @@
 """
 
 import logging
+import time
+
+from botocore.exceptions import ClientError
 
 from constant import Constant
+from utils.access_analyzer import map_regions
+from utils.clients import get_client
 from utils.sessions import get_session
 
 logger = logging.getLogger(__name__)
 logger.setLevel(getattr(logging, Constant.LOG_LEVEL))
 
+# Analyzer results
+CREATED = "Created"
+EXISTS = "Exists"
+FAILED = "Failed"
+
 
 def lambda_handler(event, context):
     """
@@ -35,18 +45,74 @@ def lambda_handler(event, context):
 
 
 def create_analyzer(event: dict) -> dict:
-    regions = event["Regions"]
+    """Makes sure every region has an account analyzer, regions are reconciled concurrently.
+
+    Regions are returned with the ones whose analyzer was already ACTIVE first, so they are scanned first.
+    """
     account_id = event["AccountId"]
     session = get_session(f"arn:aws:iam::{account_id}:role/{Constant.AWS_MASTER_ROLE}")
 
-    for region in regions:
-        analyzer_client = session.client("accessanalyzer", region_name=region)
+    results = map_regions(
+        lambda region: reconcile_analyzer(region, account_id, session),
+        event["Regions"],
+    )
+    logger.info(f"Analyzers of account {account_id}: {results}")
 
-        if len(analyzer_client.list_analyzers()["analyzers"]):
-            analyzer = analyzer_client.create_analyzer(
-                analyzerName=f"default_analyzer_{region}", type="ACCOUNT"
-            )
-            logger.debug(f"Analyzer {analyzer} created for region {region}")
-        else:
-            logger.debug(f"Analyzer already exist for region {region}")
+    failed = {
+        region: result["Error"]
+        for region, result in results.items()
+        if result["Result"] == FAILED
+    }
+    if failed:
+        raise Exception(f"Activating the analyzer failed in regions {failed}")
+
+    event["Regions"] = sorted(
+        results,
+        key=lambda region: (
+            results[region]["Status"] != "ACTIVE",
+            results[region]["Seconds"],
+        ),
+    )
+    event["AnalyzerResults"] = results
     return event
+
+
+def reconcile_analyzer(region: str, account_id: str, session) -> dict:
+    """Creates the region's account analyzer if there is none, returns the Result, analyzer Status and Seconds taken.
+
+    The client token makes retries of the same account and region return the analyzer created by the first call.
+    """
+    start = time.monotonic()
+    analyzer_client = get_client("accessanalyzer", region_name=region, session=session)
+    try:
+        analyzers = analyzer_client.list_analyzers(type="ACCOUNT")["analyzers"]
+        if analyzers:
+            logger.debug(f"Analyzer already exist for region {region}")
+            result = EXISTS
+            status = analyzers[0]["status"]
+        else:
+            analyzer_client.create_analyzer(
+                analyzerName=f"default_analyzer_{region}",
+                type="ACCOUNT",
+                clientToken=f"{account_id}-{region}-default-analyzer",
+            )
+            logger.debug(f"Analyzer created for region {region}")
+            result = CREATED
+            status = "CREATING"
+    except ClientError as ce:
+        # Note: Another execution created it between the list and the create.
+        if ce.response["Error"]["Code"] != "ConflictException":
+            return {
+                "Result": FAILED,
+                "Status": None,
+                "Error": repr(ce),
+                "Seconds": round(time.monotonic() - start, 3),
+            }
+        result = EXISTS
+        status = None
+
+    return {
+        "Result": result,
+        "Status": status,
+        "Seconds": round(time.monotonic() - start, 3),
+    }
@@ -0,0 +1,103 @@
+"""
+  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+  Licensed under the Apache License, Version 2.0 (the "License").
+  You may not use this file except in compliance with the License.
+  You may obtain a copy of the License at
+
+      http://www.apache.org/licenses/LICENSE-2.0
+
+  Unless required by applicable law or agreed to in writing, software
+  distributed under the License is distributed on an "AS IS" BASIS,
+  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+  See the License for the specific language governing permissions and
+  limitations under the License.
+
+  @author iftikhan
+  @description: Checks if the analyzer of every region has finished its initial scan and returns how long to wait
+    before checking again, so pre-existing analyzers and reruns don't wait for a fixed scan time.
+"""
+
+import logging
+import os
+from datetime import datetime, timezone
+
+from constant import Constant
+from utils.access_analyzer import get_account_analyzer, map_regions
+from utils.clients import get_client
+from utils.sessions import get_session
+
+logger = logging.getLogger(__name__)
+logger.setLevel(getattr(logging, Constant.LOG_LEVEL))
+
+# Time an analyzer is given for its initial scan, analyzers older than this are ready.
+ANALYZER_SCAN_SECONDS = int(os.environ.get("ANALYZER_SCAN_SECONDS", 1800))
+# A new analyzer is ready once it hasn't analyzed any resource for this long.
+ANALYZER_QUIET_SECONDS = int(os.environ.get("ANALYZER_QUIET_SECONDS", 300))
+# Polling backoff, POLL_SECONDS doubled on every attempt up to MAX_POLL_SECONDS
+POLL_SECONDS = 30
+MAX_POLL_SECONDS = 300
+
+
+def get_readiness(region: str, session) -> dict:
+    """Returns Ready and the Seconds left until the analyzer of the region is considered ready anyway."""
+
+    analyzer_client = get_client("accessanalyzer", region_name=region, session=session)
+    analyzer = get_account_analyzer(analyzer_client)
+    if analyzer is None:
+        return {"Ready": False, "Status": None, "Seconds": ANALYZER_SCAN_SECONDS}
+
+    if analyzer["status"] != "ACTIVE":
+        return {
+            "Ready": False,
+            "Status": analyzer["status"],
+            "Seconds": ANALYZER_SCAN_SECONDS,
+        }
+
+    now = datetime.now(timezone.utc)
+    age = (now - analyzer["createdAt"]).total_seconds()
+    last_analyzed = analyzer.get("lastResourceAnalyzedAt")
+    quiet = (now - last_analyzed).total_seconds() if last_analyzed else 0
+    return {
+        "Ready": age >= ANALYZER_SCAN_SECONDS or quiet >= ANALYZER_QUIET_SECONDS,
+        "Status": analyzer["status"],
+        "Seconds": max(0, int(ANALYZER_SCAN_SECONDS - age)),
+    }
+
+
+def lambda_handler(event, context):
+    logger.debug(f"Lambda event:{event}")
+    account_id = event["AccountId"]
+    session = get_session(f"arn:aws:iam::{account_id}:role/{Constant.AWS_MASTER_ROLE}")
+
+    readiness = map_regions(
+        lambda region: get_readiness(region, session), event["Regions"]
+    )
+    attempt = event.get("ProbeAttempt", 0)
+    waited = event.get("ProbeWaitedSeconds", 0)
+    pending = [region for region, ready in readiness.items() if not ready["Ready"]]
+
+    # Note: Regions that never get ready are scanned once the fixed scan time has passed, ScanPolicies reports them.
+    if not pending or waited >= ANALYZER_SCAN_SECONDS:
+        event["Status"] = Constant.StateMachineStates.COMPLETED
+        event["WaitSeconds"] = 0
+    else:
+        event["Status"] = Constant.StateMachineStates.WAIT
+        event["WaitSeconds"] = max(
+            1,
+            min(
+                POLL_SECONDS * 2**attempt,
+                MAX_POLL_SECONDS,
+                max(readiness[region]["Seconds"] for region in pending),
+                ANALYZER_SCAN_SECONDS - waited,
+            ),
+        )
+
+    logger.info(
+        f"Analyzers of {len(readiness) - len(pending)} regions ready, waiting for {pending}, "
+        f"next check in {event['WaitSeconds']}s"
+    )
+    event["ProbeAttempt"] = attempt + 1
+    event["ProbeWaitedSeconds"] = waited + event["WaitSeconds"]
+    event["AnalyzerReadiness"] = readiness
+    return event
@@ -29,7 +29,8 @@ from botocore.exceptions import ClientError
 
 from constant import Constant
 from me_logger import log_error
-from utils.dynamodb import get_db, update_item
+from util import iter_accounts_below_status, iter_accounts_in_status
+from utils.dynamodb import track, update_item
 from utils.notification import notify_msg
 from utils.sessions import get_session
 
@@ -43,19 +44,12 @@ def lambda_handler(event, context):
     status = Constant.StateMachineStates.WAIT
 
     # check left over accounts to send Notification
-    left_accounts = (
-        get_db(Constant.DB_TABLE)
-        .query(
-            IndexName="AccountType",
-            KeyConditionExpression="CompanyName = :cn ",
-            FilterExpression="AccountStatus = :asi",
-            ExpressionAttributeValues={
-                ":cn": company_name,
-                ":asi": Constant.AccountStatus.LEFT,
-            },
+    left_accounts = [
+        track(account)
+        for account in iter_accounts_in_status(
+            company_name=company_name, account_status=Constant.AccountStatus.LEFT
         )
-        .get("Items")
-    )
+    ]
 
     if left_accounts:
         for account in left_accounts:
@@ -63,7 +57,8 @@ def lambda_handler(event, context):
             try:
                 # Note: if assume MasterRole role fails, consider account as closed.
                 get_session(
-                    f"arn:aws:iam::{account['AccountId']}:role/{Constant.AWS_MASTER_ROLE}"
+                    f"arn:aws:iam::{account['AccountId']}:role/{Constant.AWS_MASTER_ROLE}",
+                    cached=False,
                 )
 
                 notify_data = {
@@ -117,22 +112,19 @@ def lambda_handler(event, context):
                 raise ex
     else:
         # check if all account get processed.
-        in_process_accounts = (
-            get_db(Constant.DB_TABLE)
-            .query(
-                IndexName="AccountType",
-                KeyConditionExpression="CompanyName = :cn ",
-                FilterExpression="AccountStatus < :asi AND Migrate = :mi",
-                ExpressionAttributeValues={
-                    ":cn": company_name,
-                    ":asi": Constant.AccountStatus.UPDATED,
-                    ":mi": True,
-                },
-            )
-            .get("Items")
+        # Note: Only need to know if any account is still in process, so stop at the first match.
+        in_process_account = next(
+            iter_accounts_below_status(
+                company_name=company_name,
+                account_status=Constant.AccountStatus.UPDATED,
+                projection=["AccountId"],
+                FilterExpression="Migrate = :mi",
+                ExpressionAttributeValues={":mi": True},
+            ),
+            None,
         )
 
-        if not in_process_accounts and not left_accounts:
+        if not in_process_account and not left_accounts:
             notify_data = {
                 "SlackHandle": None,
                 "SlackMessage": {
@@ -16,58 +16,64 @@
   @author iftikhan
 """
 
-import logging
-import os
+from utils.config import LambdaParam, LazyValue
 
-from botocore.exceptions import ClientError
 
-from utils.parameters import get_secured_parameter
-
-logger = logging.getLogger(__name__)
-logger.setLevel(logging.INFO)
-
-
-def get_lambda_param(pram, is_ssm: bool = False, is_ssm_secured: bool = False):
-    message = None
-    data = os.environ.get(pram)
-
-    if not data:
-        message = f"Environment param {pram} not found"
-    if is_ssm and data:
-        try:
-            data = get_secured_parameter(data, is_ssm_secured)
-        except ClientError as ce:
-            message = repr(ce)
-    if message:
-        logger.warning(message)
-    return data
+def role_config(master_account_id: str) -> dict:
+    return {
+        "MasterRole": {
+            "TrustPolicy": {
+                "Version": "2012-10-17",
+                "Statement": [
+                    {
+                        "Effect": "Allow",
+                        "Principal": {"AWS": master_account_id},
+                        "Action": ["sts:AssumeRole"],
+                    }
+                ],
+            },
+            "Policy": "arn:aws:iam::aws:policy/AdministratorAccess",
+        },
+        "MasterReadOnlyRole": {
+            "TrustPolicy": {
+                "Version": "2012-10-17",
+                "Statement": [
+                    {
+                        "Effect": "Allow",
+                        "Principal": {"AWS": master_account_id},
+                        "Action": ["sts:AssumeRole"],
+                    }
+                ],
+            },
+            "Policy": "arn:aws:iam::aws:policy/ReadOnlyAccess",
+        },
+    }
 
 
 class Constant:
-    # Lambda Parameters
-    MASTER_ACCOUNT_ID = get_lambda_param("MASTER_ACCOUNT_ID")
-    THIRD_PARTY_CLOUD_GOVERNANCE_ACCOUNT_ID = get_lambda_param(
+    # Lambda Parameters, resolved on first access
+    MASTER_ACCOUNT_ID = LambdaParam("MASTER_ACCOUNT_ID")
+    THIRD_PARTY_CLOUD_GOVERNANCE_ACCOUNT_ID = LambdaParam(
         "THIRD_PARTY_CLOUD_GOVERNANCE_ACCOUNT_ID"
     )
-    STS_EXTERNAL_ID = get_lambda_param("STS_EXTERNAL_ID")
-    NOTIFICATION_TOPIC = get_lambda_param("NOTIFICATION_TOPIC")
-    DB_TABLE = get_lambda_param("TARGET_ACCOUNT_TABLE_NAME")
-    LOG_LEVEL = get_lambda_param("LOG_LEVEL") or "INFO"
-    CASE_CC_EMAIL_ADDRESSES = (
-        get_lambda_param("CASE_CC_EMAIL_ADDRESSES").split(",")
-        if get_lambda_param("CASE_CC_EMAIL_ADDRESSES")
-        else None
+    STS_EXTERNAL_ID = LambdaParam("STS_EXTERNAL_ID")
+    NOTIFICATION_TOPIC = LambdaParam("NOTIFICATION_TOPIC")
+    DB_TABLE = LambdaParam("TARGET_ACCOUNT_TABLE_NAME")
+    LOG_LEVEL = LambdaParam("LOG_LEVEL", default="INFO")
+    CASE_CC_EMAIL_ADDRESSES = LambdaParam(
+        "CASE_CC_EMAIL_ADDRESSES", convert=lambda value: value.split(",")
     )
-    NOTIFICATION_OBSERVER_ARN = get_lambda_param("NOTIFICATION_OBSERVER_ARN")
-    SHARED_RESOURCE_BUCKET = get_lambda_param("SHARED_RESOURCE_BUCKET")
-    CREATE_SUPPORT_CASE = get_lambda_param("CREATE_SUPPORT_CASE")
+    NOTIFICATION_OBSERVER_ARN = LambdaParam("NOTIFICATION_OBSERVER_ARN")
+    PREPROCESSOR_ARN = LambdaParam("PREPROCESSOR_ARN")
+    SHARED_RESOURCE_BUCKET = LambdaParam("SHARED_RESOURCE_BUCKET")
+    CREATE_SUPPORT_CASE = LambdaParam("CREATE_SUPPORT_CASE")
 
     # Validation
-    ACCOUNT_NAME_VALIDATION = get_lambda_param("ACCOUNT_NAME_VALIDATION")
-    ACCOUNT_EMAIL_VALIDATION = get_lambda_param("ACCOUNT_EMAIL_VALIDATION")
+    ACCOUNT_NAME_VALIDATION = LambdaParam("ACCOUNT_NAME_VALIDATION")
+    ACCOUNT_EMAIL_VALIDATION = LambdaParam("ACCOUNT_EMAIL_VALIDATION")
 
-    # Secure Sting SSM parameters
-    SLACK_TOPIC = get_lambda_param("SLACK_TOPIC", is_ssm=True)
+    # Secure Sting SSM parameters, all fetched with one GetParameters call
+    SLACK_TOPIC = LambdaParam("SLACK_TOPIC", is_ssm=True)
 
     # Patterns
     ACCOUNT_NAME_PATTERN = r"^([a-z]{2})(\d{7})\s{1}\w+\s{1}\w+$"
@@ -94,6 +100,7 @@ class Constant:
         CRLE = "Create master role in Linked account  Error"
         CRME = "Create master role in Master account error"
         CUE = "Cleanup Error"
+        IVE = "Input Validation Error"
         NHE = "Notification Handler Error"
         JOE = "Join Organization Error"
         LDE = "Load Data Error"
@@ -108,7 +115,7 @@ class Constant:
     )
     NOTIFICATION_TITLE = "Migration Engine"
 
-    DEFAULT_OU_ID = get_lambda_param("_DEFAULT_OU_ID")
+    DEFAULT_OU_ID = LambdaParam("_DEFAULT_OU_ID")
 
     AWS_MASTER_ROLE = "MasterRole"
 
@@ -125,34 +132,7 @@ class Constant:
         OU = "ORGANIZATIONAL_UNIT"
 
     # Role policy
-    ROLE_CONFIG = {
-        "MasterRole": {
-            "TrustPolicy": {
-                "Version": "2012-10-17",
-                "Statement": [
-                    {
-                        "Effect": "Allow",
-                        "Principal": {"AWS": MASTER_ACCOUNT_ID},
-                        "Action": ["sts:AssumeRole"],
-                    }
-                ],
-            },
-            "Policy": "arn:aws:iam::aws:policy/AdministratorAccess",
-        },
-        "MasterReadOnlyRole": {
-            "TrustPolicy": {
-                "Version": "2012-10-17",
-                "Statement": [
-                    {
-                        "Effect": "Allow",
-                        "Principal": {"AWS": MASTER_ACCOUNT_ID},
-                        "Action": ["sts:AssumeRole"],
-                    }
-                ],
-            },
-            "Policy": "arn:aws:iam::aws:policy/ReadOnlyAccess",
-        },
-    }
+    ROLE_CONFIG = LazyValue(lambda constant: role_config(constant.MASTER_ACCOUNT_ID))
 
     class AccountStatus:
         INVITED = 1  # Account has left the current organization and ready to accept invitation.
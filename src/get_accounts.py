@@ -20,7 +20,7 @@ import logging
 import time
 
 from constant import Constant
-from utils.dynamodb import get_db
+from util import iter_accounts_below_status
 
 logger = logging.getLogger(__name__)
 logger.setLevel(getattr(logging, Constant.LOG_LEVEL))
@@ -30,19 +30,12 @@ def get_accounts(company_name):
     """
     Fetch all record belongs to target company names.
     """
-    # Custom query
-    accounts = (
-        get_db(Constant.DB_TABLE)
-        .query(
-            ProjectionExpression="CompanyName, AccountId",
-            KeyConditionExpression="CompanyName = :cn",
-            FilterExpression=" AccountStatus < :as",
-            ExpressionAttributeValues={
-                ":cn": company_name,
-                ":as": Constant.AccountStatus.UPDATED,
-            },
+    accounts = list(
+        iter_accounts_below_status(
+            company_name=company_name,
+            account_status=Constant.AccountStatus.UPDATED,
+            projection=["CompanyName", "AccountId"],
         )
-        .get("Items")
     )
 
     for acc in accounts:
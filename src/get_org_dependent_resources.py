@@ -16,14 +16,32 @@
   @author iftikhan
 """
 
+import json
 import logging
-
-from botocore.exceptions import ClientError
+import time
+from datetime import datetime
 
 from constant import Constant
 from me_logger import log_error
-from util import get_account_by_id, get_org_id
-from utils.dynamodb import update_item
+from middleware import account_handler
+from util import get_org_id
+from utils.access_analyzer import (
+    EXPOSED,
+    classify_findings,
+    get_account_analyzer,
+    iter_active_findings,
+    iter_updated_findings,
+    map_regions,
+)
+from utils.clients import get_client
+from utils.findings_snapshot import (
+    apply_findings,
+    get_snapshot,
+    get_watermark,
+    new_snapshot,
+    save_snapshot,
+)
+from utils.notification import notify_msg
 from utils.sessions import get_session
 
 logger = logging.getLogger(__name__)
@@ -33,16 +51,28 @@ logger.setLevel(getattr(logging, Constant.LOG_LEVEL))
 def get_org_level_resources(
     region: str, account: dict, session, _org_id, target_org_id
 ) -> dict:
+    """Scans the region's analyzer findings, returns the region's Status, exposed Resources and Seconds taken.
+
+    Only resources newly exposed or fixed since the previous scan are notified.
+    Runs in the region scan threads, so the account is only read here.
+    """
+    start = time.monotonic()
     status = Constant.StateMachineStates.COMPLETED
+    org_level_permissions = []
+    newly_exposed = []
+    newly_fixed = []
+    snapshot = None
+    applied = 0
 
-    analyzer_client = session.client("accessanalyzer", region_name=region)
+    analyzer_client = get_client("accessanalyzer", region_name=region, session=session)
 
     logger.debug(f"analyzer for region: {region}")
 
-    analysers = analyzer_client.list_analyzers()["analyzers"]
+    analyzer = get_account_analyzer(analyzer_client)
+    is_active = analyzer is not None and analyzer["status"] == "ACTIVE"
 
-    if not analysers:
-        msg = f"No Analyzer found in  region {region}"
+    if not is_active:
+        msg = f"No active Analyzer found in  region {region}"
         log_error(
             logger=logger,
             account_id=account["AccountId"],
@@ -52,64 +82,30 @@ def get_org_level_resources(
             notify=True,
             slack_handle=account["SlackHandle"],
         )
-        update_item(Constant.DB_TABLE, account)
-        return Constant.StateMachineStates.WAIT
-
-    arn = analysers[0]["arn"]
-    # check for PrincipalOrgID
-
-    org_level_resource_list = []
-    org_issues = [
-        resource["resource"]
-        for resource in analyzer_client.list_findings(
-            analyzerArn=arn,
-            filter={"condition.aws:PrincipalOrgID": {"contains": [target_org_id]}},
-        )["findings"]
-        if resource["status"] == "ACTIVE"
-    ]
-    if org_issues:
-        org_issues_resolved = [
-            resource["resource"]
-            for resource in analyzer_client.list_findings(
-                analyzerArn=arn,
-                filter={"condition.aws:PrincipalOrgID": {"contains": [_org_id]}},
-            )["findings"]
-            if resource["status"] == "ACTIVE"
-        ]
-
-        org_level_resource_list = list(
-            set(org_issues).symmetric_difference(set(org_issues_resolved))
+        status = Constant.StateMachineStates.WAIT
+    else:
+        arn = analyzer["arn"]
+        snapshot, applied = update_findings_snapshot(
+            analyzer_client, arn, account["AccountId"], region
         )
 
-    # check for PrincipalOrgID
-    org_path_level_resource_list = []
-    org_path_issue = [
-        resource["resource"]
-        for resource in analyzer_client.list_findings(
-            analyzerArn=arn,
-            filter={"condition.aws:PrincipalOrgPaths": {"contains": [target_org_id]}},
-        )["findings"]
-        if resource["status"] == "ACTIVE"
-    ]
-    if org_path_issue:
-        org_path_resolved = [
-            resource["resource"]
-            for resource in analyzer_client.list_findings(
-                analyzerArn=arn,
-                filter={"condition.aws:PrincipalOrgPaths": {"contains": [_org_id]}},
-            )["findings"]
-            if resource["status"] == "ACTIVE"
-        ]
-
-        org_path_level_resource_list = list(
-            set(org_path_issue).symmetric_difference(set(org_path_resolved))
+        # Note: The snapshot holds the ACTIVE findings, classified locally by resource ARN.
+        findings = classify_findings(
+            snapshot["Findings"].values(), target_org_id, _org_id
         )
-
-    org_level_permissions = org_level_resource_list + org_path_level_resource_list
+        logger.info(
+            f"Region {region}: "
+            + ", ".join(
+                f"{len(resources)} {bucket}" for bucket, resources in findings.items()
+            )
+        )
+        org_level_permissions = findings[EXPOSED]
+        newly_exposed = sorted(set(org_level_permissions) - set(snapshot["Exposed"]))
+        newly_fixed = sorted(set(snapshot["Exposed"]) - set(org_level_permissions))
 
     if org_level_permissions:
         status = Constant.StateMachineStates.WAIT
-        for resource in org_level_permissions:
+        for resource in newly_exposed:
             msg = f"Resource {resource} is using organization level permission to access resource"
             log_error(
                 logger=logger,
@@ -120,68 +116,121 @@ def get_org_level_resources(
                 notify=True,
                 slack_handle=account["SlackHandle"],
             )
+    if newly_fixed:
+        notify_fixed_resources(account, region, newly_fixed)
+
+    # Note: Saved once notified, so a failed notification is sent again by the next scan.
+    if is_active and (applied or newly_exposed or newly_fixed):
+        snapshot["Exposed"] = org_level_permissions
+        save_snapshot(
+            Constant.SHARED_RESOURCE_BUCKET, account["AccountId"], region, snapshot
+        )
 
-        account["OrgLevelPermissions"] = org_level_permissions
-        update_item(Constant.DB_TABLE, account)
-
-    return status
-
-
-def lambda_handler(event, context):
-    logger.debug(f"Lambda event:{event}")
-    status = set({})
-
+    return {
+        "Status": status,
+        "Resources": org_level_permissions,
+        "NewlyExposed": len(newly_exposed),
+        "NewlyFixed": len(newly_fixed),
+        "Seconds": round(time.monotonic() - start, 3),
+    }
+
+
+def update_findings_snapshot(
+    analyzer_client, analyzer_arn: str, account_id: str, region: str
+) -> tuple:
+    """Returns the region's findings snapshot brought up to date and the number of findings applied to it.
+
+    The first scan, or a scan after the analyzer changed, reads every ACTIVE finding. Later scans only read the
+    findings updated since the snapshot's Watermark.
+    """
+    snapshot = get_snapshot(Constant.SHARED_RESOURCE_BUCKET, account_id, region)
+    if snapshot and snapshot["AnalyzerArn"] == analyzer_arn and snapshot["Watermark"]:
+        findings = iter_updated_findings(
+            analyzer_client, analyzer_arn, get_watermark(snapshot)
+        )
+    else:
+        snapshot = new_snapshot(analyzer_arn)
+        findings = iter_active_findings(analyzer_client, analyzer_arn)
+
+    applied = apply_findings(snapshot, findings)
+    logger.debug(f"Applied {applied} findings to the snapshot of region {region}")
+    return snapshot, applied
+
+
+def notify_fixed_resources(account: dict, region: str, resources: list):
+    notify_data = {
+        "SlackHandle": account["SlackHandle"],
+        "SlackMessage": {
+            "attachments": [
+                {
+                    "color": "#36a64f",
+                    "author_name": Constant.AUTHOR_NAME,
+                    "author_icon": Constant.AUTHOR_ICON,
+                    "title": "Organization Level Permissions Fixed",
+                    "text": f"Account: {account['AccountId']} of company {account['CompanyName']}, "
+                    f"resources of region {region} no longer use organization level permissions:\n"
+                    + "\n".join(resources),
+                    "footer": Constant.NOTIFICATION_NOTES,
+                    "ts": datetime.now().timestamp(),
+                }
+            ]
+        },
+    }
+    notify_msg(
+        Constant.NOTIFICATION_TOPIC,
+        Constant.NOTIFICATION_TITLE,
+        json.dumps(notify_data),
+    )
+
+
+@account_handler(error_type=Constant.ErrorType.OLPE)
+def lambda_handler(event, uow):
     account_id = event["AccountId"]
     company_name = event["CompanyName"]
-    account = None
-
-    try:
-        account = get_account_by_id(company_name=company_name, account_id=account_id)[0]
-        session = get_session(
-            f"arn:aws:iam::{account_id}:role/{Constant.AWS_MASTER_ROLE}"
-        )
 
-        target_org_id = get_org_id(session=session)
-        AWS_org_id = get_org_id()
-
-        for region in event["Regions"]:
-            status.add(
-                get_org_level_resources(
-                    region, account, session, AWS_org_id, target_org_id
-                )
-            )
-
-        if {Constant.StateMachineStates.WAIT}.issubset(status):
-            event["Status"] = Constant.StateMachineStates.WAIT
-        else:
-            account["IsPermissionsScanned"] = True
-            event["Status"] = Constant.StateMachineStates.COMPLETED
-
-    except ClientError as ce:
-        error_msg = log_error(
-            logger=logger,
-            account_id=event["AccountId"],
-            company_name=event["CompanyName"],
-            error_type=Constant.ErrorType.OLPE,
-            error=ce,
-            notify=True,
-            slack_handle=account.get("SlackHandle"),
-        )
-        account["Error"] = error_msg
-        raise ce
+    account = uow.get_account(company_name, account_id)
+    session = get_session(f"arn:aws:iam::{account_id}:role/{Constant.AWS_MASTER_ROLE}")
+
+    target_org_id = get_org_id(session=session)
+    AWS_org_id = get_org_id()
+
+    # Note: Regions are scanned concurrently with the one account session, results are merged afterwards so the
+    # account gets a single update.
+    start = time.monotonic()
+    regions = event["Regions"]
+    scans = map_regions(
+        lambda region: get_org_level_resources(
+            region, account, session, AWS_org_id, target_org_id
+        ),
+        regions,
+    )
+
+    event["RegionScans"] = {
+        region: {
+            "Status": scan["Status"],
+            "Exposed": len(scan["Resources"]),
+            "NewlyExposed": scan["NewlyExposed"],
+            "NewlyFixed": scan["NewlyFixed"],
+            "Seconds": scan["Seconds"],
+        }
+        for region, scan in scans.items()
+    }
+    logger.info(
+        f"Scanned {len(regions)} regions in {time.monotonic() - start:.2f}s: {event['RegionScans']}"
+    )
+
+    org_level_permissions = sorted(
+        {resource for scan in scans.values() for resource in scan["Resources"]}
+    )
+    if org_level_permissions or account.get("OrgLevelPermissions"):
+        account["OrgLevelPermissions"] = org_level_permissions
 
-    except Exception as ex:
-        log_error(
-            logger=logger,
-            account_id=event["AccountId"],
-            company_name=event["CompanyName"],
-            error_type=Constant.ErrorType.OLPE,
-            notify=True,
-            error=ex,
-        )
-        raise ex
-    finally:
-        if account:
-            update_item(Constant.DB_TABLE, account)
+    if any(
+        scan["Status"] == Constant.StateMachineStates.WAIT for scan in scans.values()
+    ):
+        event["Status"] = Constant.StateMachineStates.WAIT
+    else:
+        account["IsPermissionsScanned"] = True
+        event["Status"] = Constant.StateMachineStates.COMPLETED
 
     return event
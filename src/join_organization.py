@@ -18,32 +18,31 @@
 
 import logging
 
-import boto3
 from botocore.exceptions import ClientError
 
 from constant import Constant
-from me_logger import log_error
-from util import get_account_by_id
-from utils.dynamodb import update_item
+from middleware import account_handler, error_code_msg, set_status
+from utils.clients import get_client
 from utils.sessions import get_session
 
 logger = logging.getLogger(__name__)
 logger.setLevel(getattr(logging, Constant.LOG_LEVEL))
 
 
-def lambda_handler(event, context):
-    logger.debug(f"Lambda event:{event}")
-    account = None
-    try:
-        account = get_account_by_id(
-            company_name=event["CompanyName"], account_id=event["AccountId"]
-        )[0]
-        # Note: We don't want to join org for account that need to be suspended or already joined.
-        if account["AccountStatus"] >= Constant.AccountStatus.JOINED:
-            event["Status"] = Constant.StateMachineStates.COMPLETED
-            return event
+@account_handler(
+    error_type=Constant.ErrorType.JOE,
+    on_client_error=set_status(Constant.StateMachineStates.WAIT),
+    error_msg=error_code_msg,
+)
+def lambda_handler(event, uow):
+    account = uow.get_account(event["CompanyName"], event["AccountId"])
+    # Note: We don't want to join org for account that need to be suspended or already joined.
+    if account["AccountStatus"] >= Constant.AccountStatus.JOINED:
+        event["Status"] = Constant.StateMachineStates.COMPLETED
+        return event
 
-        _org_client = boto3.session.Session().client("organizations")
+    try:
+        _org_client = get_client("organizations")
         handshake_id = get_invitation(_org_client, account.get("AccountId"))
         account["HandshakeId"] = handshake_id
 
@@ -65,46 +64,20 @@ def lambda_handler(event, context):
         )
         linked_org_client = account_session.client("organizations")
         linked_org_client.accept_handshake(HandshakeId=handshake_id)
-
-        logger.info(
-            f"Invitation with handshakeId as {handshake_id} to "
-            f"AccountId {account.get('AccountId')} got accepted successfully."
-        )
-        account["AccountStatus"] = Constant.AccountStatus.JOINED
-        event["Status"] = Constant.StateMachineStates.COMPLETED
-
     except ClientError as ce:
         # INFO: join organization API is not thread safe we need to wait in case organization is
         # busy with adding other account.
         if ce.response["Error"]["Code"] == "ConcurrentModificationException":
             event["Status"] = Constant.StateMachineStates.CONCURRENCY_WAIT
             return event
-
-        msg = f"{ce.response['Error']['Code']}: {ce.response['Error']['Message']}"
-        account["Error"] = log_error(
-            logger=logger,
-            account_id=account["AccountId"],
-            company_name=account["CompanyName"],
-            error_type=Constant.ErrorType.JOE,
-            msg=msg,
-            error=ce,
-            notify=True,
-            slack_handle=account["SlackHandle"],
-        )
-        event["Status"] = Constant.StateMachineStates.WAIT
-    except Exception as ex:
-        log_error(
-            logger=logger,
-            account_id=event["AccountId"],
-            company_name=event["CompanyName"],
-            error_type=Constant.ErrorType.JOE,
-            notify=True,
-            error=ex,
-        )
-        raise ex
-    finally:
-        if account:
-            update_item(Constant.DB_TABLE, account)
+        raise ce
+
+    logger.info(
+        f"Invitation with handshakeId as {handshake_id} to "
+        f"AccountId {account.get('AccountId')} got accepted successfully."
+    )
+    account["AccountStatus"] = Constant.AccountStatus.JOINED
+    event["Status"] = Constant.StateMachineStates.COMPLETED
 
     return event
 
@@ -23,22 +23,19 @@ from botocore.exceptions import ClientError
 
 from constant import Constant
 from me_logger import log_error
-from util import get_account_by_id, get_master_account
-from utils.dynamodb import update_item
-from utils.sessions import get_session
+from middleware import account_handler, set_status
+from util import get_master_account
+from utils.sessions import get_session, session_pool
 
 logger = logging.getLogger(__name__)
 logger.setLevel(getattr(logging, Constant.LOG_LEVEL))
 
 
-def leave_org(event):
-    account = None
-    try:
-        event["Status"] = Constant.StateMachineStates.COMPLETED
-        account = get_account_by_id(
-            company_name=event["CompanyName"], account_id=event["AccountId"]
-        )[0]
+def leave_org(event, uow):
+    event["Status"] = Constant.StateMachineStates.COMPLETED
+    account = uow.get_account(event["CompanyName"], event["AccountId"])
 
+    try:
         # INFO: If account already left the organization
         if account["AccountStatus"] >= Constant.AccountStatus.INVITED:
             event["Status"] = Constant.StateMachineStates.COMPLETED
@@ -51,7 +48,7 @@ def leave_org(event):
             master_record = get_master_account(company_name=event["CompanyName"])[0]
 
             master_account_id = master_record["AccountId"]
-            master_session = get_session(
+            master_session = session_pool.get_master_session(
                 f"arn:aws:iam::{master_account_id}:role/{master_record['AdminRole']}"
             )
             organization_client = master_session.client("organizations")
@@ -153,37 +150,15 @@ def leave_org(event):
             account["AccountStatus"] = Constant.AccountStatus.INVITED
             event["Status"] = Constant.StateMachineStates.COMPLETED
             return event
+        raise ce
 
-        account["Error"] = log_error(
-            logger=logger,
-            account_id=account["AccountId"],
-            company_name=account["CompanyName"],
-            error=ce,
-            error_type=Constant.ErrorType.LOE,
-            notify=True,
-            slack_handle=account["SlackHandle"],
-        )
-
-        event["Status"] = Constant.StateMachineStates.WAIT
-
-    except Exception as ex:
-        log_error(
-            logger=logger,
-            account_id=event["AccountId"],
-            company_name=event["CompanyName"],
-            error_type=Constant.ErrorType.LOE,
-            notify=True,
-            error=ex,
-        )
-        raise ex
 
+@account_handler(
+    error_type=Constant.ErrorType.LOE,
+    on_client_error=set_status(Constant.StateMachineStates.WAIT),
+)
+def lambda_handler(event, uow):
+    try:
+        return leave_org(event.get("Data") or event, uow)
     finally:
-        if account:
-            update_item(Constant.DB_TABLE, account)
-
-    return event
-
-
-def lambda_handler(event, context):
-    logger.debug(f"Lambda event:{event}")
-    return leave_org(event.get("Data") or event)
+        session_pool.log_stats()
@@ -0,0 +1,115 @@
+"""
+  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+  Licensed under the Apache License, Version 2.0 (the "License").
+  You may not use this file except in compliance with the License.
+  You may obtain a copy of the License at
+
+      http://www.apache.org/licenses/LICENSE-2.0
+
+  Unless required by applicable law or agreed to in writing, software
+  distributed under the License is distributed on an "AS IS" BASIS,
+  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+  See the License for the specific language governing permissions and
+  limitations under the License.
+
+  @author iftikhan
+  @description: Loads a workbook holding the accounts of several companies, on any number of sheets, and starts the
+    Preprocessor for each company. Event: {"FilePath": "<key in the shared bucket>", "ForceReload": false}
+"""
+
+import json
+import logging
+import re
+import time
+
+from constant import Constant
+from load_data import is_loaded, load_accounts
+from me_logger import log_error
+from utils.clients import get_client
+from utils.data import iter_accounts_by_company, iter_workbook_sheets
+from utils.ingestion_cache import get_file_version, get_manifest
+
+logger = logging.getLogger(__name__)
+logger.setLevel(getattr(logging, Constant.LOG_LEVEL))
+
+
+def split_by_company(sheets) -> dict:
+    """Groups the accounts of every sheet by CompanyName, see iter_accounts_by_company."""
+    companies = {}
+    for company_name, account in iter_accounts_by_company(sheets):
+        companies.setdefault(company_name, []).append(account)
+    return companies
+
+
+def start_preprocessor(company_name: str, file_path: str) -> str:
+    # Note: Execution names only allow letters, numbers, - and _ with at most 80 characters.
+    name = re.sub(r"[^\w-]", "-", company_name)[:50]
+    response = get_client("stepfunctions").start_execution(
+        stateMachineArn=Constant.PREPROCESSOR_ARN,
+        name=f"{name}-{time.monotonic_ns()}",
+        # Note: MultiCompany makes LoadData only read this company's accounts if it has to load the file again.
+        input=json.dumps(
+            {"CompanyName": company_name, "FilePath": file_path, "MultiCompany": True}
+        ),
+    )
+    return response["executionArn"]
+
+
+def lambda_handler(event, context):
+    logger.debug(f"Lambda event:{event}")
+    file_path = event["FilePath"]
+    s3_url = f"s3://{Constant.SHARED_RESOURCE_BUCKET}/{file_path}"
+
+    try:
+        file_version = get_file_version(Constant.SHARED_RESOURCE_BUCKET, file_path)
+        start = time.monotonic()
+        companies = split_by_company(iter_workbook_sheets(s3_url))
+        logger.info(
+            f"Read {sum(len(accounts) for accounts in companies.values())} accounts of {len(companies)} companies "
+            f"from {s3_url} in {time.monotonic() - start:.2f}s"
+        )
+    except Exception as ex:
+        log_error(
+            logger=logger,
+            account_id=None,
+            company_name=None,
+            error_type=Constant.ErrorType.LDE,
+            notify=True,
+            error=ex,
+        )
+        raise ex
+
+    executions = {}
+    errors = {}
+    for company_name, accounts in companies.items():
+        try:
+            manifest = (
+                None
+                if event.get("ForceReload")
+                else get_manifest(Constant.SHARED_RESOURCE_BUCKET, company_name)
+            )
+            # Note: The Preprocessor's LoadData finds the file unchanged in the cache and doesn't load it again.
+            if not is_loaded(company_name, file_path, file_version, manifest):
+                load_accounts(company_name, file_path, file_version, manifest, accounts)
+            executions[company_name] = start_preprocessor(company_name, file_path)
+        except Exception as ex:
+            errors[company_name] = log_error(
+                logger=logger,
+                account_id=None,
+                company_name=company_name,
+                error_type=Constant.ErrorType.LDE,
+                notify=True,
+                error=ex,
+            )
+
+    if errors:
+        raise Exception(
+            f"Loading companies {list(errors)} of {s3_url} failed, "
+            f"Preprocessor started for {list(executions)}"
+        )
+
+    return {
+        "Status": Constant.StateMachineStates.COMPLETED,
+        "Executions": executions,
+    }
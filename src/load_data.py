@@ -16,54 +16,400 @@
   @author iftikhan
 """
 
+import hashlib
 import json
 import logging
 from datetime import datetime
 
 from constant import Constant
 from me_logger import log_error
-from util import get_accounts_by_company_name
-from utils.data import get_account_data
-from utils.dynamodb import batch_write
+from util import (
+    get_accounts_by_ids,
+    iter_accounts_by_company_name,
+    list_organization_accounts,
+)
+from utils.clients import get_client
+from utils.data import (
+    iter_account_data,
+    iter_accounts_by_company,
+    iter_spooled_rows,
+    iter_workbook_sheets,
+    process_record,
+    spool_rows,
+)
+from utils.dynamodb import (
+    BATCH_GET_SIZE,
+    batch_write,
+    convert_empty_values,
+    update_item,
+)
+from utils.ingestion_cache import (
+    get_file_version,
+    get_hash_index,
+    get_manifest,
+    is_unchanged,
+    save_cache,
+)
 from utils.notification import notify_msg
+from utils.sessions import session_pool
+from validation import RowValidator
 
 logger = logging.getLogger(__name__)
 logger.setLevel(getattr(logging, Constant.LOG_LEVEL))
 
 
-def generate_account_updates(company_name: str, account_data: list):
-    existing_accounts = get_accounts_by_company_name(company_name=company_name)
-    existing_account_id_list = [record["AccountId"] for record in existing_accounts]
-    new_accounts = [
-        account
-        for account in account_data
-        if not account["AccountId"].zfill(12) in existing_account_id_list
-    ]
-    for account in new_accounts:
-        # Since all accounts in the file must be from the same company only the first record must have the company name.
-        if account.get("CompanyName") and account["CompanyName"] != company_name:
-            raise ValueError("All accounts must belong to the same company.")
+# Columns of the discovered accounts the organization doesn't know about
+DISCOVERY_DEFAULTS = {"Migrate": True, "SlackHandle": "", "Tags": "[]"}
+# Columns identifying the account, not part of the account content
+KEY_COLUMNS = ("CompanyName", "AccountId")
+CONTENT_HASH = "ContentHash"
 
-    return new_accounts
+
+def content_hash(account: dict) -> str:
+    """Hash of the account columns read from the input file, stored with the record to find changed rows."""
+
+    content = {key: value for key, value in account.items() if key not in KEY_COLUMNS}
+    return hashlib.sha1(
+        json.dumps(convert_empty_values(content), sort_keys=True, default=str).encode(
+            "utf-8"
+        )
+    ).hexdigest()
+
+
+def generate_account_updates(
+    company_name: str,
+    account_data,
+    stats: dict = None,
+    existing_hashes: dict = None,
+    loaded_hashes: dict = None,
+):
+    """Sorts account_data into new, changed and unchanged accounts and yields the new ones.
+
+    Existing records are indexed by AccountId with their ContentHash, a row is changed when its hash differs.
+    Changed rows are applied in BATCH_GET_SIZE chunks while account_data is read, only their changed attributes
+    are written. account_data can be a generator. If provided, stats is filled with the number of New, Changed and
+    Unchanged accounts.
+
+    existing_hashes, i.e. the index of the last ingested file, replaces the query of the company's records. Accounts
+    whose hash matches it are unchanged without reading the table. As it only covers the last ingested file,
+    accounts missing from it are checked against the table before being written as new.
+    loaded_hashes is filled with the ContentHash of every account in account_data.
+    """
+    stats = stats if stats is not None else {}
+    stats.update({"New": 0, "Changed": 0, "Unchanged": 0})
+
+    check_new = existing_hashes is not None
+    if existing_hashes is None:
+        existing_accounts = iter_accounts_by_company_name(
+            company_name=company_name, projection=["AccountId", CONTENT_HASH]
+        )
+        existing_hashes = {
+            record["AccountId"]: record.get(CONTENT_HASH)
+            for record in existing_accounts
+        }
+
+    pending_accounts = []
+    for account in account_data:
+        account["AccountId"] = account["AccountId"].zfill(12)
+        # Note: Only the first record must have the company name, see validation.ACCOUNT_SCHEMA
+        account["CompanyName"] = company_name
+        account[CONTENT_HASH] = content_hash(account)
+        if loaded_hashes is not None:
+            loaded_hashes[account["AccountId"]] = account[CONTENT_HASH]
+
+        if account["AccountId"] not in existing_hashes and not check_new:
+            stats["New"] += 1
+            logger.debug(
+                f"New AccountId {account['AccountId']} for company {company_name}"
+            )
+            yield account
+        elif existing_hashes.get(account["AccountId"]) == account[CONTENT_HASH]:
+            stats["Unchanged"] += 1
+        else:
+            pending_accounts.append(account)
+            if len(pending_accounts) >= BATCH_GET_SIZE:
+                yield from apply_account_updates(company_name, pending_accounts, stats)
+                pending_accounts = []
+
+    if pending_accounts:
+        yield from apply_account_updates(company_name, pending_accounts, stats)
+
+
+def apply_account_updates(company_name: str, accounts: list, stats: dict):
+    """Applies the input columns of the accounts to their records, only the changed attributes are written.
+
+    Accounts without a record are yielded to be written as new.
+    """
+
+    records = get_accounts_by_ids(
+        company_name=company_name,
+        account_ids=[account["AccountId"] for account in accounts],
+    )
+    for account in accounts:
+        record = records.get(account["AccountId"])
+        if record is None:
+            stats["New"] += 1
+            yield account
+        elif record.get(CONTENT_HASH) == account[CONTENT_HASH]:
+            stats["Unchanged"] += 1
+        else:
+            stats["Changed"] += 1
+            record.update(convert_empty_values(account))
+            update_item(Constant.DB_TABLE, record)
+
+
+def report_violations(company_name: str, s3_url: str, validator: RowValidator):
+    """Saves the validation report as JSON next to the input file and sends a single notification for all rows."""
+
+    report = validator.report(s3_url)
+    key = f"ae_validation_report_{company_name}_{datetime.now()}.json"
+    get_client("s3").put_object(
+        Body=json.dumps(report, indent=2).encode("utf-8"),
+        Bucket=Constant.SHARED_RESOURCE_BUCKET,
+        Key=key,
+        ContentType="application/json",
+    )
+    log_error(
+        logger=logger,
+        account_id=None,
+        company_name=company_name,
+        error_type=Constant.ErrorType.IVE,
+        notify=True,
+        msg=f"{report['InvalidRows']} of {report['Rows']} rows of {s3_url} are invalid and were not loaded, "
+        f"see s3://{Constant.SHARED_RESOURCE_BUCKET}/{key} for details",
+    )
+
+
+def load_accounts(
+    company_name: str,
+    file_path: str,
+    file_version: dict,
+    manifest: dict = None,
+    account_data=None,
+):
+    """Loads the company's accounts of the file, account_data are the accounts if the file was already read.
+
+    file_path is either a key of the shared bucket or an url, i.e. organizations://<master account id>.
+    """
+
+    s3_url = (
+        file_path
+        if "://" in file_path
+        else f"s3://{Constant.SHARED_RESOURCE_BUCKET}/{file_path}"
+    )
+    # Note: The index of the previously loaded file, if any, is used instead of querying the company's records.
+    existing_hashes = (
+        get_hash_index(Constant.SHARED_RESOURCE_BUCKET, company_name)
+        if manifest
+        else None
+    )
+
+    # Note: The file is streamed and validated row by row, the valid rows are staged in a temporary file and only
+    # written once the whole file is read, so a file that fails to parse halfway doesn't leave the company partially
+    # loaded. Invalid rows are never written.
+    validator = RowValidator(company_name=company_name)
+    stats = {}
+    loaded_hashes = {}
+    with spool_rows(
+        validator.filter(
+            iter_account_data(s3_url) if account_data is None else account_data
+        )
+    ) as staged_accounts:
+        account_updates = generate_account_updates(
+            company_name,
+            iter_spooled_rows(staged_accounts),
+            stats,
+            existing_hashes=existing_hashes,
+            loaded_hashes=loaded_hashes,
+        )
+        write_result = batch_write(
+            Constant.DB_TABLE, account_updates, is_account_data=True
+        )
+    logger.debug(f"Batch write partitions: {write_result['Partitions']}")
+    if validator.violations:
+        report_violations(company_name, s3_url, validator)
+    if write_result["Failed"]:
+        # Note: Raising keeps the ingestion cache as is, so the next run loads the file again.
+        raise Exception(
+            f"{write_result['Failed']} new accounts of {s3_url} couldn't be written, see CloudWatch logs for details"
+        )
+    if stats["New"] or stats["Changed"]:
+        logger.info(
+            f"Loaded {stats['New']} new and {stats['Changed']} changed accounts for company {company_name}, "
+            f"{stats['Unchanged']} accounts of {s3_url} are unchanged"
+        )
+    else:
+        logging.warning(
+            f"No new or changed account for company {company_name} included in {s3_url}"
+        )
+
+    save_cache(
+        Constant.SHARED_RESOURCE_BUCKET,
+        company_name,
+        {
+            "File": file_path,
+            **file_version,
+            "LoadedOn": datetime.utcnow().isoformat(),
+            "Rows": validator.rows,
+            "InvalidRows": len(validator.violations),
+        },
+        loaded_hashes,
+    )
+
+
+def is_loaded(
+    company_name: str, file_path: str, file_version: dict, manifest: dict
+) -> bool:
+    """True if the file version is the one loaded last, only the manifest is read.
+
+    Tools deleting account records clear the company's cache (see ingestion_cache.clear_cache), records deleted by
+    hand are recreated by loading the file with ForceReload.
+    """
+    if not is_unchanged(manifest, file_path, file_version):
+        return False
+
+    logger.info(
+        f"{file_path} is unchanged since it was loaded on {manifest['LoadedOn']}, skipping the load"
+    )
+    return True
+
+
+def load_file(
+    company_name: str,
+    file_path: str,
+    force_reload: bool = False,
+    multi_company: bool = False,
+):
+    """Loads the file unless it was loaded last, multi_company files are workbooks shared by several companies."""
+    file_version = get_file_version(Constant.SHARED_RESOURCE_BUCKET, file_path)
+    manifest = (
+        None
+        if force_reload
+        else get_manifest(Constant.SHARED_RESOURCE_BUCKET, company_name)
+    )
+    if is_loaded(company_name, file_path, file_version, manifest):
+        return
+
+    account_data = None
+    if multi_company:
+        # Note: Only the company's accounts are loaded, from every sheet, see load_companies.
+        account_data = (
+            account
+            for name, account in iter_accounts_by_company(
+                iter_workbook_sheets(
+                    f"s3://{Constant.SHARED_RESOURCE_BUCKET}/{file_path}"
+                )
+            )
+            if name == company_name
+        )
+    load_accounts(company_name, file_path, file_version, manifest, account_data)
+
+
+def discover_accounts(
+    company_name: str,
+    master_account_id: str,
+    admin_role: str,
+    linked_admin_role: str = None,
+    overrides=None,
+) -> list:
+    """Builds the records of every account of the master account's organization.
+
+    The non-empty columns of the overrides, i.e. rows of a XLS read without converters, replace the discovered values
+    of the same AccountId. Overrides of accounts that aren't in the organization are added as they are.
+    """
+    master_role_arn = f"arn:aws:iam::{master_account_id}:role/{admin_role}"
+    session = session_pool.get_master_session(master_role_arn)
+    overrides_by_id = {
+        override["AccountId"].zfill(12): override for override in overrides or []
+    }
+
+    accounts = []
+    for org_account in list_organization_accounts(session):
+        is_master = org_account["Id"] == master_account_id
+        account = {
+            **DISCOVERY_DEFAULTS,
+            "CompanyName": company_name,
+            "AccountId": org_account["Id"],
+            "AccountName": org_account["Name"],
+            "Email": org_account["Email"],
+            "OrganizationStatus": org_account["Status"],
+            "AccountType": (
+                Constant.AccountType.MASTER
+                if is_master
+                else Constant.AccountType.LINKED
+            ),
+            "AdminRole": admin_role if is_master else linked_admin_role or admin_role,
+            "Migrate": org_account["Status"] == "ACTIVE",
+        }
+        override = overrides_by_id.pop(account["AccountId"], None)
+        if override:
+            # Note: Blank cells are dropped before the conversion, i.e. to_bool would turn a blank Migrate to False.
+            account.update(
+                process_record(
+                    {
+                        key: value
+                        for key, value in override.items()
+                        if value not in ("", None)
+                    }
+                )
+            )
+        accounts.append(account)
+
+    logger.info(
+        f"Discovered {len(accounts)} accounts in the organization of {master_account_id}, "
+        f"{len(overrides_by_id)} accounts of the overrides aren't in it"
+    )
+    accounts.extend(process_record(override) for override in overrides_by_id.values())
+    return accounts
+
+
+def load_discovered_accounts(company_name: str, event: dict):
+    overrides = (
+        iter_account_data(
+            f"s3://{Constant.SHARED_RESOURCE_BUCKET}/{event['FilePath']}", converters={}
+        )
+        if event.get("FilePath")
+        else None
+    )
+    accounts = discover_accounts(
+        company_name,
+        event["MasterAccountId"].zfill(12),
+        event["AdminRole"],
+        event.get("LinkedAdminRole"),
+        overrides,
+    )
+    # Note: The organization can change at any time, discovered accounts are always loaded. The previous index is
+    # still used to find the changed accounts.
+    load_accounts(
+        company_name,
+        f"organizations://{event['MasterAccountId'].zfill(12)}",
+        {"ETag": None, "VersionId": None},
+        get_manifest(Constant.SHARED_RESOURCE_BUCKET, company_name),
+        accounts,
+    )
 
 
 def lambda_handler(event, context):
+    """Loads the company's accounts from event FilePath, or from its organization when MasterAccountId is set.
+
+    File event: {"CompanyName", "FilePath", "ForceReload" (optional), "MultiCompany" (optional, set by
+    load_companies for workbooks shared by several companies)}
+    Discovery event: {"CompanyName", "MasterAccountId", "AdminRole", "LinkedAdminRole" (optional, defaults to
+    AdminRole), "FilePath" (optional, per account overrides)}
+    """
     logger.debug(f"Lambda event:{event}")
     company_name = event["CompanyName"]
-    s3_url = f"s3://{Constant.SHARED_RESOURCE_BUCKET}/{event['FilePath']}"
 
     try:
-        account_data = get_account_data(s3_url)
-        account_updates = generate_account_updates(company_name, account_data)
-        if account_updates:
-            account_ids = [account["AccountId"] for account in account_updates]
-            logger.info(
-                f"Loading account data for company {company_name} for the following AccountIds: {account_ids}"
-            )
-            batch_write(Constant.DB_TABLE, account_updates, is_account_data=True)
+        if event.get("MasterAccountId"):
+            load_discovered_accounts(company_name, event)
         else:
-            logging.warning(
-                f"No new account for company {company_name} included in {s3_url}"
+            # Note: Re-runs of an unchanged file are skipped, set ForceReload in the event to load it anyway.
+            load_file(
+                company_name,
+                event["FilePath"],
+                event.get("ForceReload"),
+                event.get("MultiCompany"),
             )
 
         notify_data = {
@@ -0,0 +1,172 @@
+"""
+  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+  Licensed under the Apache License, Version 2.0 (the "License").
+  You may not use this file except in compliance with the License.
+  You may obtain a copy of the License at
+
+      http://www.apache.org/licenses/LICENSE-2.0
+
+  Unless required by applicable law or agreed to in writing, software
+  distributed under the License is distributed on an "AS IS" BASIS,
+  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+  See the License for the specific language governing permissions and
+  limitations under the License.
+
+  @author iftikhan
+  @description: Handler middleware shared by the account Lambdas. It loads account records once, keeps track of
+    the changes and writes each account at most once per invocation, classifies and reports errors and times the
+    handler.
+"""
+
+import functools
+import logging
+import time
+
+from botocore.exceptions import ClientError
+
+from constant import Constant
+from me_logger import log_error
+from util import get_account_by_id, get_master_account
+from utils.config import config
+from utils.dynamodb import TrackedItem, track, update_item
+
+logger = logging.getLogger(__name__)
+logger.setLevel(getattr(logging, Constant.LOG_LEVEL))
+
+
+class UnitOfWork:
+    """Account records used by one handler invocation, flushed with a single write per account on commit."""
+
+    def __init__(self, table: str = Constant.DB_TABLE):
+        self.table = table
+        self.accounts = {}
+        self.writes = 0
+
+    @property
+    def account(self):
+        """The first account loaded, i.e. the account the invocation is about."""
+        return next(iter(self.accounts.values()), None)
+
+    def get_account(self, company_name: str, account_id: str):
+        account = self.accounts.get((company_name, account_id))
+        if account is None:
+            account = self.register(
+                get_account_by_id(
+                    table=self.table, company_name=company_name, account_id=account_id
+                )[0]
+            )
+        return account
+
+    def get_master_account(self, company_name: str):
+        accounts = get_master_account(table=self.table, company_name=company_name)
+        return [self.register(account) for account in accounts]
+
+    def register(self, account: dict):
+        key = (account["CompanyName"], account["AccountId"])
+        if key in self.accounts:
+            return self.accounts[key]
+        if not isinstance(account, TrackedItem):
+            account = track(account)
+        self.accounts[key] = account
+        return account
+
+    def commit(self):
+        for account in self.accounts.values():
+            changed, removed = account.changes()
+            if changed or removed:
+                update_item(self.table, account)
+                self.writes += 1
+
+
+def account_handler(error_type: str, on_client_error=None, error_msg=None):
+    """Decorator for Lambda handlers working on account records.
+
+    The decorated function is called as fn(event, uow) and loads its accounts through the UnitOfWork, the changes are
+    written once when the handler ends, whatever the outcome. If the write fails after the handler failed, the
+    write error is logged and the handler's error is raised.
+    ClientErrors are reported, with the message built by error_msg(error) if provided, and stored in the account's
+    Error column, then on_client_error(event, error) builds the handler response, if it's not provided the error is
+    raised. Any other exception is reported and raised.
+    """
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(event, context):
+            logger.debug(f"Lambda event:{event}")
+            start = time.monotonic()
+            uow = UnitOfWork()
+            data = (event.get("Data") or event) if isinstance(event, dict) else {}
+            try:
+                response = fn(event, uow)
+            except ClientError as ce:
+                account = uow.account or {}
+                formatted_error_msg = log_error(
+                    logger=logger,
+                    account_id=account.get("AccountId") or data.get("AccountId"),
+                    company_name=account.get("CompanyName") or data.get("CompanyName"),
+                    error_type=error_type,
+                    error=ce,
+                    msg=error_msg(ce) if error_msg else "",
+                    notify=True,
+                    slack_handle=account.get("SlackHandle"),
+                )
+                if uow.account is not None:
+                    uow.account["Error"] = formatted_error_msg
+                if not on_client_error:
+                    _finish(fn, uow, start, ce)
+                    raise ce
+                try:
+                    response = on_client_error(event, ce)
+                except Exception as callback_error:
+                    # Note: i.e. the callback only handles some error codes and raises the others.
+                    _finish(fn, uow, start, callback_error)
+                    raise callback_error
+            except Exception as ex:
+                log_error(
+                    logger=logger,
+                    account_id=data.get("AccountId"),
+                    company_name=data.get("CompanyName"),
+                    error_type=error_type,
+                    notify=True,
+                    error=ex,
+                )
+                _finish(fn, uow, start, ex)
+                raise ex
+            _finish(fn, uow, start)
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def _finish(fn, uow: UnitOfWork, start: float, error: Exception = None):
+    """Commits the unit of work, a commit error is only raised if the handler didn't fail with error already."""
+    try:
+        uow.commit()
+    except Exception as commit_error:
+        if error is None:
+            raise commit_error
+        logger.error(f"Writing the accounts failed after {error!r}: {commit_error!r}")
+    finally:
+        logger.info(
+            f"{fn.__module__}.{fn.__name__} took {time.monotonic() - start:.3f}s "
+            f"with {uow.writes} account writes, config {config.stats()}"
+        )
+
+
+def error_code_msg(error: ClientError) -> str:
+    """error_msg that puts the error code in front of the message."""
+    return f"{error.response['Error']['Code']}: {error.response['Error']['Message']}"
+
+
+def set_status(status: str, wrap_data: bool = False):
+    """Returns an on_client_error callback that sets the Status of the (unwrapped) event and returns it."""
+
+    def on_client_error(event, error):
+        data = event.get("Data") or event
+        data["Status"] = status
+        return {"Data": data} if wrap_data else data
+
+    return on_client_error
@@ -33,9 +33,8 @@ import json
 import logging
 import time
 
-import boto3
-
 from constant import Constant
+from utils.clients import get_client
 
 logger = logging.getLogger(__name__)
 logger.setLevel(getattr(logging, Constant.LOG_LEVEL))
@@ -48,7 +47,7 @@ def lambda_handler(event, context):
 
 
 def handle_error(error: dict):
-    sfn_client = boto3.client("stepfunctions")
+    sfn_client = get_client("stepfunctions")
     sfn_client.start_execution(
         stateMachineArn=Constant.NOTIFICATION_OBSERVER_ARN,
         name=f"{error.get('CompanyName') or 'General'}-"
@@ -23,20 +23,83 @@ import json
 import logging
 import re
 
-import boto3
-import xlwt
 from botocore.exceptions import ClientError
-from jinja2 import Template
-from xlwt.compat import basestring
 
 from constant import Constant
 from me_logger import log_error
 from util import get_accounts_by_company_name, get_all_accounts
+from utils.clients import get_client
 from utils.notification import notify_msg
 
 logger = logging.getLogger(__name__)
 logger.setLevel(getattr(logging, Constant.LOG_LEVEL))
 
+# jinja2 Template of the HTML report
+HTML_TEMPLATE = (
+    "<table> "
+    "{% set glob={'isHeader':true} %}"
+    "{% for account in accounts %}"
+    "{% if glob.isHeader %}"
+    "{% set _ = glob.update({'isHeader':false}) %}"
+    "<tr  style='background: gray;'>"
+    "{% for key,value in account.items() %}"
+    "<th > {{ key }} </th>"
+    "{% endfor %}"
+    "</tr>"
+    "{% endif %}"
+    "<tr>"
+    "{% for key,value in account.items() %}"
+    "<td> {{ value }} </td>"
+    "{% endfor %}"
+    "</tr>"
+    "{% endfor %}"
+    "</table>"
+    "<style>"
+    "th {background-color: #4CAF50;color: white;}"
+    "th, td {padding: 5px;text-align: left;}"
+    "tr:nth-child(even) {background-color: #f2f2f2;}"
+    "</style>"
+)
+
+
+def build_xls(accounts: list) -> bytes:
+    # Note: xlwt and jinja2 are imported on first use, importing the module doesn't load them.
+    import xlwt
+
+    workbook = xlwt.Workbook()
+    worksheet = workbook.add_sheet("MigrationEngineReport")
+    cols_data = [key for key, value in accounts[0].items()]
+
+    # Adding headers
+    for i, field_name in enumerate(cols_data):
+        worksheet.write(0, i, field_name)
+        worksheet.col(i).width = 6000
+
+    style = xlwt.easyxf("align: wrap yes")
+    # Adding  row data
+    for row_index, row in enumerate(accounts):
+        for cell_index, cell_value in enumerate(row.items()):
+            cell_value = cell_value[1]
+            if isinstance(cell_value, str):
+                cell_value = re.sub("\r", " ", cell_value)
+            if not cell_value:
+                cell_value = None
+            worksheet.write(row_index + 1, cell_index, cell_value, style)
+
+    # uncomment below line if you want to save it in local file system
+    # workbook.save('output.xls')
+
+    # Reading xls data to upload on s3
+    with io.BytesIO() as fp:
+        workbook.save(fp)
+        return fp.getvalue()
+
+
+def build_html(accounts: list) -> str:
+    from jinja2 import Template
+
+    return Template(HTML_TEMPLATE).render(accounts=accounts)
+
 
 def lambda_handler(event, context):
     logger.debug(f"Lambda event:{event}")
@@ -56,42 +119,10 @@ def lambda_handler(event, context):
             raise Exception("This is no account records in database to report")
         else:
             # XLS Flow
-            workbook = xlwt.Workbook()
-            worksheet = workbook.add_sheet("MigrationEngineReport")
-            cols_data = [key for key, value in accounts[0].items()]
-
-            # Adding headers
-            for i, field_name in enumerate(cols_data):
-                worksheet.write(0, i, field_name)
-                worksheet.col(i).width = 6000
-
-            style = xlwt.easyxf("align: wrap yes")
-            # Adding  row data
-            for row_index, row in enumerate(accounts):
-                for cell_index, cell_value in enumerate(row.items()):
-                    cell_value = cell_value[1]
-                    if isinstance(cell_value, basestring):
-                        cell_value = re.sub("\r", " ", cell_value)
-                    if not cell_value:
-                        cell_value = None
-                    worksheet.write(row_index + 1, cell_index, cell_value, style)
-
-            # uncomment below line if you want to save it in local file system
-            # workbook.save('output.xls')
-
-            # Reading xls data to upload on s3
-            try:
-                fp = io.BytesIO()
-                workbook.save(fp)
-                fp.seek(0)
-                data = fp.read()
-            except IOError as ioe:
-                logger.error(ioe)
-            finally:
-                fp.close()
+            data = build_xls(accounts)
 
             # Uploading xls data to upload to s3
-            s3_client = boto3.client("s3")
+            s3_client = get_client("s3")
             s3_client.put_object(
                 Body=data, Bucket=Constant.SHARED_RESOURCE_BUCKET, Key=f"{key}.xls"
             )
@@ -104,35 +135,7 @@ def lambda_handler(event, context):
             )
 
             # HTML Flow
-            # jinja2 Template
-            template = Template(
-                "<table> "
-                "{% set glob={'isHeader':true} %}"
-                "{% for account in accounts %}"
-                "{% if glob.isHeader %}"
-                "{% set _ = glob.update({'isHeader':false}) %}"
-                "<tr  style='background: gray;'>"
-                "{% for key,value in account.items() %}"
-                "<th > {{ key }} </th>"
-                "{% endfor %}"
-                "</tr>"
-                "{% endif %}"
-                "<tr>"
-                "{% for key,value in account.items() %}"
-                "<td> {{ value }} </td>"
-                "{% endfor %}"
-                "</tr>"
-                "{% endfor %}"
-                "</table>"
-                "<style>"
-                "th {background-color: #4CAF50;color: white;}"
-                "th, td {padding: 5px;text-align: left;}"
-                "tr:nth-child(even) {background-color: #f2f2f2;}"
-                "</style>"
-            )
-
-            # Generate HTML
-            report_data = template.render(accounts=accounts)
+            report_data = build_html(accounts)
             # Upload HTML data to s3
             s3_client.put_object(
                 Body=bytes(report_data, "utf-8"),
@@ -198,6 +201,3 @@ def lambda_handler(event, context):
         "Status": Constant.StateMachineStates.COMPLETED,
         "CompanyName": company_name,
     }
-
-
-lambda_handler({}, None)
@@ -21,11 +21,11 @@ import logging
 import re
 from time import sleep
 
-import boto3
 from botocore.exceptions import ClientError
 
 from constant import Constant
 from util import get_account_by_id
+from utils.clients import get_client
 
 logger = logging.getLogger(__name__)
 logger.setLevel(getattr(logging, Constant.LOG_LEVEL))
@@ -84,7 +84,7 @@ def lambda_handler(event, context):
     if account["AccountStatus"] > Constant.AccountStatus.UPDATED:
         return event
 
-    s3_client = boto3.client("s3")
+    s3_client = get_client("s3")
     file_name = f"tag-{event['CompanyName']}.json"
     while True:
         object_tag = ""
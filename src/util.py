@@ -20,12 +20,19 @@ import json
 import logging
 from time import sleep
 
-import boto3
 from botocore.exceptions import ClientError
 
 from constant import Constant
 from me_logger import log_error
-from utils.dynamodb import get_db
+from utils.clients import get_client
+from utils.dynamodb import (
+    SCAN_SEGMENTS,
+    batch_get_items,
+    get_db,
+    parallel_scan_items,
+    query_items,
+    track,
+)
 from utils.sessions import get_session
 
 logger = logging.getLogger(__name__)
@@ -35,21 +42,18 @@ logger.setLevel(getattr(logging, Constant.LOG_LEVEL))
 # Note:
 # "CompanyName" and  "AccountId" Keys in account table
 # AccountType:  global Index on "CompanyName" and "AccountType"
+# AccountStatus:  global Index on "CompanyName" and "AccountStatus"
 
 
 def get_master_account(table: str = Constant.DB_TABLE, company_name: str = None):
-    accounts = (
-        get_db(table)
-        .query(
-            IndexName="AccountType",
-            KeyConditionExpression="CompanyName = :cn AND AccountType = :at",
-            ExpressionAttributeValues={
-                ":cn": company_name,
-                ":at": Constant.AccountType.MASTER,
-            },
+    accounts = [
+        track(account)
+        for account in iter_accounts_by_type(
+            table=table,
+            company_name=company_name,
+            account_type=Constant.AccountType.MASTER,
         )
-        .get("Items")
-    )
+    ]
 
     if accounts and len(accounts) > 1:
         msg = f"System Error: Multiple master account found: {accounts}"
@@ -69,41 +73,69 @@ def get_master_account(table: str = Constant.DB_TABLE, company_name: str = None)
 def get_accounts_by_type(
     table: str = Constant.DB_TABLE, company_name: str = None, account_type: str = None
 ):
-    return (
-        get_db(table)
-        .query(
-            IndexName="AccountType",
-            KeyConditionExpression="CompanyName = :cn AND AccountType = :at",
-            ExpressionAttributeValues={":cn": company_name, ":at": account_type},
+    return list(
+        iter_accounts_by_type(
+            table=table, company_name=company_name, account_type=account_type
         )
-        .get("Items")
+    )
+
+
+def iter_accounts_by_type(
+    table: str = Constant.DB_TABLE,
+    company_name: str = None,
+    account_type: str = None,
+    projection: list = None,
+    page_size: int = None,
+):
+    return query_items(
+        table,
+        projection=projection,
+        page_size=page_size,
+        IndexName="AccountType",
+        KeyConditionExpression="CompanyName = :cn AND AccountType = :at",
+        ExpressionAttributeValues={":cn": company_name, ":at": account_type},
     )
 
 
 def get_account_by_id(
     table: str = Constant.DB_TABLE, company_name: str = None, account_id: str = None
 ):
-    return (
-        get_db(table)
-        .query(
+    return [
+        track(account)
+        for account in query_items(
+            table,
             KeyConditionExpression="CompanyName = :cn AND AccountId = :at",
             ExpressionAttributeValues={":cn": company_name, ":at": account_id},
         )
-        .get("Items")
-    )
+    ]
+
+
+def get_accounts_by_ids(
+    table: str = Constant.DB_TABLE, company_name: str = None, account_ids: list = None
+) -> dict:
+    """Fetches many accounts of a company in a few BatchGetItem round trips, returns a dict keyed by AccountId.
+
+    AccountIds without a record are missing from the returned dict.
+    """
+    keys = [
+        {"CompanyName": company_name, "AccountId": account_id}
+        for account_id in account_ids or []
+    ]
+    return {
+        account["AccountId"]: track(account) for account in batch_get_items(table, keys)
+    }
 
 
 def get_accounts_by_status(
     table: str = Constant.DB_TABLE, company_name: str = None, account_type: str = None
 ):
-    return (
-        get_db(table)
-        .query(
+    return list(
+        query_items(
+            table,
             KeyConditionExpression="CompanyName = :cn ",
             FilterExpression="AccountType = :a",
-            ExpressionAttributeValues={":cn": company_name, ":ma": account_type},
+            ExpressionAttributeValues={":cn": company_name, ":a": account_type},
         )
-        .get("Items")
     )
 
 
@@ -113,9 +145,9 @@ def get_account_by_status_and_id(
     account_status: str = None,
     account_id: str = None,
 ):
-    return (
-        get_db(table)
-        .query(
+    return list(
+        query_items(
+            table,
             KeyConditionExpression="CompanyName =:cn AND AccountId =:aid ",
             FilterExpression="AccountStatus =:as",
             ExpressionAttributeValues={
@@ -124,38 +156,146 @@ def get_account_by_status_and_id(
                 ":aid": account_id,
             },
         )
-        .get("Items")
     )
 
 
 def get_accounts_by_company_name(
     table: str = Constant.DB_TABLE, company_name: str = None
 ):
-    return (
-        get_db(table)
-        .query(
-            KeyConditionExpression="CompanyName = :cn",
-            ExpressionAttributeValues={":cn": company_name},
-        )
-        .get("Items")
+    return list(iter_accounts_by_company_name(table=table, company_name=company_name))
+
+
+def iter_accounts_by_company_name(
+    table: str = Constant.DB_TABLE,
+    company_name: str = None,
+    projection: list = None,
+    page_size: int = None,
+    **kwargs,
+):
+    """Streams every account of the company page by page instead of loading the whole company in memory.
+
+    Extra kwargs (i.e. FilterExpression, ExpressionAttributeValues) are passed to the query as is.
+    """
+    values = kwargs.pop("ExpressionAttributeValues", {})
+    return query_items(
+        table,
+        projection=projection,
+        page_size=page_size,
+        KeyConditionExpression="CompanyName = :cn",
+        ExpressionAttributeValues={":cn": company_name, **values},
+        **kwargs,
+    )
+
+
+def iter_accounts_in_status(
+    table: str = Constant.DB_TABLE,
+    company_name: str = None,
+    account_status: int = None,
+    projection: list = None,
+    page_size: int = None,
+    **kwargs,
+):
+    """Streams the company's accounts with the given AccountStatus, reading only matching items from the index."""
+    return _query_account_status(
+        table, "=", company_name, account_status, projection, page_size, kwargs
     )
 
 
-def get_all_accounts(table: str = Constant.DB_TABLE):
-    return get_db(table).scan().get("Items")
+def iter_accounts_below_status(
+    table: str = Constant.DB_TABLE,
+    company_name: str = None,
+    account_status: int = None,
+    projection: list = None,
+    page_size: int = None,
+    **kwargs,
+):
+    """Streams the company's accounts with AccountStatus lower than the given one, i.e. accounts still in flight."""
+    return _query_account_status(
+        table, "<", company_name, account_status, projection, page_size, kwargs
+    )
 
 
-def get_org_id(session=None):
-    org_client = (
-        session.client("organizations") if session else boto3.client("organizations")
+def _query_account_status(
+    table, operator, company_name, account_status, projection, page_size, kwargs
+):
+    values = kwargs.pop("ExpressionAttributeValues", {})
+    return query_items(
+        table,
+        projection=projection,
+        page_size=page_size,
+        IndexName="AccountStatus",
+        KeyConditionExpression=f"CompanyName = :cn AND AccountStatus {operator} :as",
+        ExpressionAttributeValues={
+            ":cn": company_name,
+            ":as": account_status,
+            **values,
+        },
+        **kwargs,
     )
+
+
+def backfill_account_status(
+    table: str = Constant.DB_TABLE, total_segments: int = SCAN_SEGMENTS
+) -> int:
+    """Sets a numeric AccountStatus on records missing one, so existing records show up in the AccountStatus index.
+
+    Records with a numeric string keep their value, anything else is reset to 0 (not yet processed).
+    """
+    updated = 0
+    db = get_db(table)
+    for account in parallel_scan_items(
+        table,
+        total_segments=total_segments,
+        projection=["CompanyName", "AccountId", "AccountStatus"],
+        FilterExpression="attribute_not_exists(AccountStatus) "
+        "OR NOT attribute_type(AccountStatus, :n)",
+        ExpressionAttributeValues={":n": "N"},
+    ):
+        account_status = str(account.get("AccountStatus", ""))
+        try:
+            db.update_item(
+                Key={
+                    "CompanyName": account["CompanyName"],
+                    "AccountId": account["AccountId"],
+                },
+                UpdateExpression="SET AccountStatus = :as",
+                ConditionExpression="attribute_not_exists(AccountStatus) "
+                "OR NOT attribute_type(AccountStatus, :n)",
+                ExpressionAttributeValues={
+                    ":as": int(account_status) if account_status.isdigit() else 0,
+                    ":n": "N",
+                },
+            )
+            updated += 1
+        except ClientError as ce:
+            # Note: Someone else already set a numeric status, nothing to backfill.
+            if ce.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise ce
+
+    logger.info(f"Backfilled AccountStatus for {updated} records of {table}")
+    return updated
+
+
+def get_all_accounts(
+    table: str = Constant.DB_TABLE, total_segments: int = SCAN_SEGMENTS, stats=None
+):
+    return list(parallel_scan_items(table, total_segments=total_segments, stats=stats))
+
+
+def get_org_id(session=None):
+    org_client = get_client("organizations", session=session)
     return org_client.describe_organization()["Organization"]["Id"]
 
 
+def list_organization_accounts(session=None):
+    """Yields every account of the session's organization, ListAccounts returns at most 20 accounts per page."""
+    org_client = get_client("organizations", session=session)
+    for page in org_client.get_paginator("list_accounts").paginate():
+        yield from page["Accounts"]
+
+
 def get_parent_id(session=None, account_id=None, parent_type=None):
-    org_client = (
-        session.client("organizations") if session else boto3.client("organizations")
-    )
+    org_client = get_client("organizations", session=session)
     parents = org_client.list_parents(ChildId=account_id)["Parents"]
     for parent in parents:
         if parent["Type"] == parent_type:
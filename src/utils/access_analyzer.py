@@ -0,0 +1,127 @@
+"""
+  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+  Licensed under the Apache License, Version 2.0 (the "License").
+  You may not use this file except in compliance with the License.
+  You may obtain a copy of the License at
+
+      http://www.apache.org/licenses/LICENSE-2.0
+
+  Unless required by applicable law or agreed to in writing, software
+  distributed under the License is distributed on an "AS IS" BASIS,
+  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+  See the License for the specific language governing permissions and
+  limitations under the License.
+
+  @author iftikhan
+  @description: IAM Access Analyzer helpers, findings are read in a single paginated pass and classified locally.
+"""
+
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Regions handled at once, each one is a few Access Analyzer round trips
+REGION_WORKERS = int(os.environ.get("REGION_SCAN_WORKERS", 8))
+
+# Policy conditions that grant access to a whole organization
+ORG_CONDITION_KEYS = ["aws:PrincipalOrgID", "aws:PrincipalOrgPaths"]
+
+# Exposure buckets of a resource, per condition key
+EXPOSED = "Exposed"  # Only the current organization is allowed, access breaks once the account moves
+UPDATED = "Updated"  # Both organizations are allowed
+NEW_ORG_ONLY = "NewOrgOnly"  # Only the new organization is allowed
+
+
+def map_regions(fn, regions: list, workers: int = REGION_WORKERS) -> dict:
+    """Runs fn(region) for every region in a thread pool, returns {region: result} in the order of regions.
+
+    The first exception raised by fn is raised once every region is done.
+    """
+
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(regions)))) as executor:
+        return dict(zip(regions, executor.map(fn, regions)))
+
+
+def get_account_analyzer(analyzer_client):
+    """Returns the ACTIVE account analyzer of the region, else any account analyzer (i.e. CREATING), else None.
+
+    Organization analyzers are ignored, as activate_analyzer only creates and reconciles account analyzers.
+    """
+
+    analyzers = analyzer_client.list_analyzers(type="ACCOUNT")["analyzers"]
+    return next(
+        (analyzer for analyzer in analyzers if analyzer["status"] == "ACTIVE"),
+        analyzers[0] if analyzers else None,
+    )
+
+
+def iter_active_findings(analyzer_client, analyzer_arn: str):
+    """Yields every ACTIVE finding of the analyzer, the status is filtered by the service."""
+
+    paginator = analyzer_client.get_paginator("list_findings")
+    for page in paginator.paginate(
+        analyzerArn=analyzer_arn, filter={"status": {"eq": ["ACTIVE"]}}
+    ):
+        yield from page["findings"]
+
+
+def iter_updated_findings(analyzer_client, analyzer_arn: str, since):
+    """Yields the findings of any status updated at or after since, newest first."""
+
+    paginator = analyzer_client.get_paginator("list_findings")
+    for page in paginator.paginate(
+        analyzerArn=analyzer_arn, sort={"attributeName": "updatedAt", "orderBy": "DESC"}
+    ):
+        for finding in page["findings"]:
+            # Note: Findings updated in the same second as since are applied again, which is harmless.
+            if finding["updatedAt"] < since:
+                return
+            yield finding
+
+
+def classify_findings(findings, current_org_id: str, new_org_id: str) -> dict:
+    """Sorts the resources of the findings into exposure buckets.
+
+    The findings are indexed by resource ARN first, as a resource gets one finding per principal and condition.
+    A resource is in a bucket if it is for any of the ORG_CONDITION_KEYS, EXPOSED taking precedence.
+    Returns {bucket: sorted resource ARNs}.
+    """
+
+    # {resource ARN: {condition key: set of the organizations allowed}}
+    index = {}
+    for finding in findings:
+        condition = finding.get("condition") or {}
+        for key in ORG_CONDITION_KEYS:
+            value = condition.get(key)
+            if not value:
+                continue
+            # Note: Same as the service side "contains" filter, PrincipalOrgPaths values start with the org id.
+            orgs = index.setdefault(finding["resource"], {}).setdefault(key, set())
+            if current_org_id in value:
+                orgs.add(current_org_id)
+            if new_org_id in value:
+                orgs.add(new_org_id)
+
+    buckets = {EXPOSED: [], UPDATED: [], NEW_ORG_ONLY: []}
+    for resource, keys in index.items():
+        resource_buckets = {
+            _bucket(orgs, current_org_id, new_org_id) for orgs in keys.values()
+        }
+        for bucket in buckets:
+            if bucket in resource_buckets:
+                buckets[bucket].append(resource)
+                break
+    for resources in buckets.values():
+        resources.sort()
+    return buckets
+
+
+def _bucket(orgs: set, current_org_id: str, new_org_id: str):
+    if current_org_id in orgs:
+        return UPDATED if new_org_id in orgs else EXPOSED
+    if new_org_id in orgs:
+        return NEW_ORG_ONLY
@@ -0,0 +1,94 @@
+"""
+  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+  Licensed under the Apache License, Version 2.0 (the "License").
+  You may not use this file except in compliance with the License.
+  You may obtain a copy of the License at
+
+      http://www.apache.org/licenses/LICENSE-2.0
+
+  Unless required by applicable law or agreed to in writing, software
+  distributed under the License is distributed on an "AS IS" BASIS,
+  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+  See the License for the specific language governing permissions and
+  limitations under the License.
+
+  @author iftikhan
+  @description: Shared boto3 client and resource factory, clients are built once per container and reused
+"""
+
+import logging
+import os
+import threading
+
+from botocore.config import Config
+
+from utils.sessions import get_default_session, get_source_identity
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Note: Should match the highest thread concurrency used with a single client, otherwise urllib3 discards
+# connections once the pool is full.
+MAX_POOL_CONNECTIONS = int(os.environ.get("MAX_POOL_CONNECTIONS", 16))
+
+# Note: Keep STS calls in the Lambda's region instead of the global us-east-1 endpoint.
+os.environ.setdefault("AWS_STS_REGIONAL_ENDPOINTS", "regional")
+
+_clients = {}
+_clients_lock = threading.Lock()
+# Note: boto3 resources are not thread safe, so they are cached per thread.
+_resources = threading.local()
+
+
+def get_client(
+    service: str,
+    region_name: str = None,
+    session=None,
+    max_pool_connections: int = MAX_POOL_CONNECTIONS,
+):
+    """Returns a cached client for (credentials, service, region), creating it on first use."""
+
+    session = session or get_default_session()
+    key = (
+        get_source_identity(session),
+        service,
+        region_name,
+        max_pool_connections,
+    )
+    with _clients_lock:
+        client = _clients.get(key)
+        if not client:
+            logger.debug(f"Creating {service} client for region {region_name}")
+            client = session.client(
+                service,
+                region_name=region_name,
+                config=Config(max_pool_connections=max_pool_connections),
+            )
+            _clients[key] = client
+    return client
+
+
+def get_resource(service: str, region_name: str = None, session=None):
+    """Returns a cached resource for (credentials, service, region) owned by the calling thread."""
+
+    session = session or get_default_session()
+    key = (get_source_identity(session), service, region_name)
+    if not hasattr(_resources, "cache"):
+        _resources.cache = {}
+    resource = _resources.cache.get(key)
+    if not resource:
+        logger.debug(f"Creating {service} resource for region {region_name}")
+        resource = session.resource(
+            service,
+            region_name=region_name,
+            config=Config(max_pool_connections=MAX_POOL_CONNECTIONS),
+        )
+        _resources.cache[key] = resource
+    return resource
+
+
+def clear_clients():
+    with _clients_lock:
+        _clients.clear()
+    _resources.cache = {}
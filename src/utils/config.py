@@ -0,0 +1,155 @@
+"""
+  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+  Licensed under the Apache License, Version 2.0 (the "License").
+  You may not use this file except in compliance with the License.
+  You may obtain a copy of the License at
+
+      http://www.apache.org/licenses/LICENSE-2.0
+
+  Unless required by applicable law or agreed to in writing, software
+  distributed under the License is distributed on an "AS IS" BASIS,
+  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+  See the License for the specific language governing permissions and
+  limitations under the License.
+
+  @author iftikhan
+  @description: Lambda configuration resolved on first access. Environment values are cached per container, SSM
+    backed values are all fetched with a single GetParameters call and cached for CONFIG_TTL seconds.
+"""
+
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Seconds SSM backed values are cached before being fetched again
+CONFIG_TTL = int(os.environ.get("CONFIG_TTL", 300))
+
+_UNSET = object()
+
+
+class LambdaConfig:
+    """Per container cache of the LambdaParam values."""
+
+    def __init__(self, ttl: int = CONFIG_TTL):
+        self.ttl = ttl
+        self.params = []
+        self.resolve_seconds = 0.0
+        self.ssm_calls = 0
+        self._values = {}
+        self._lock = threading.RLock()
+
+    def register(self, param):
+        self.params.append(param)
+
+    def get(self, param):
+        value, expires_at = self._values.get(param, (_UNSET, None))
+        if value is _UNSET or (expires_at and expires_at < time.monotonic()):
+            with self._lock:
+                value, expires_at = self._values.get(param, (_UNSET, None))
+                if value is _UNSET or (expires_at and expires_at < time.monotonic()):
+                    start = time.monotonic()
+                    if param.is_ssm:
+                        self._resolve_ssm()
+                    else:
+                        self._values[param] = (
+                            param.resolve(os.environ.get(param.name)),
+                            None,
+                        )
+                    self.resolve_seconds += time.monotonic() - start
+                    value = self._values[param][0]
+        return value
+
+    def stats(self) -> dict:
+        return {
+            "ResolveSeconds": round(self.resolve_seconds, 3),
+            "SsmCalls": self.ssm_calls,
+            "Cached": len(self._values),
+        }
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def _resolve_ssm(self):
+        # Note: The environment holds the SSM parameter name, if it can't be fetched the name is used as the value.
+        ssm_params = [param for param in self.params if param.is_ssm]
+        names = {param: os.environ.get(param.name) for param in ssm_params}
+        ssm_names = sorted({name for name in names.values() if name})
+
+        values = {}
+        if ssm_names:
+            # Note: Imported on first use, so importing constant doesn't load boto3.
+            from botocore.exceptions import ClientError
+
+            from utils.parameters import get_parameters
+
+            start = time.monotonic()
+            try:
+                values, invalid_names = get_parameters(
+                    ssm_names,
+                    with_decryption=any(param.is_ssm_secured for param in ssm_params),
+                )
+                if invalid_names:
+                    logger.warning(f"SSM parameters {invalid_names} not found")
+            except ClientError as ce:
+                logger.warning(repr(ce))
+            self.ssm_calls += 1
+            logger.info(
+                f"Resolved {len(ssm_names)} SSM parameters in {time.monotonic() - start:.3f}s"
+            )
+
+        expires_at = time.monotonic() + self.ttl
+        for param, name in names.items():
+            self._values[param] = (param.resolve(values.get(name, name)), expires_at)
+
+
+config = LambdaConfig()
+
+
+class LambdaParam:
+    """Class attribute read from the environment, or from SSM when is_ssm is set, on first access.
+
+    default is used when the value is empty, convert (i.e. split) is applied to non empty values.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        is_ssm: bool = False,
+        is_ssm_secured: bool = False,
+        default=None,
+        convert=None,
+    ):
+        self.name = name
+        self.is_ssm = is_ssm
+        self.is_ssm_secured = is_ssm_secured
+        self.default = default
+        self.convert = convert
+        config.register(self)
+
+    def __get__(self, instance, owner):
+        return config.get(self)
+
+    def resolve(self, value):
+        if not value:
+            logger.warning(f"Environment param {self.name} not found")
+            return self.default
+        return self.convert(value) if self.convert else value
+
+
+class LazyValue:
+    """Class attribute built by build(owner) on first access, for values derived from LambdaParams."""
+
+    def __init__(self, build):
+        self.build = build
+        self.value = _UNSET
+
+    def __get__(self, instance, owner):
+        if self.value is _UNSET:
+            self.value = self.build(owner)
+        return self.value
@@ -17,19 +17,50 @@
   @description: Code used to get or write data
 """
 
+import csv
+import io
+import json
 import logging
-import re
+import os
+import shutil
+import tempfile
 
-import boto3
-from xlrd.book import open_workbook_xls
+from utils.clients import get_client
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
+# Size of the chunks read from the S3 object body by the streaming readers
+CHUNK_SIZE = 1024 * 1024
+# Rows staged by spool_rows are kept in memory up to this size, then in a temporary file
+SPOOL_MAX_SIZE = int(os.environ.get("SPOOL_MAX_SIZE", 8 * 1024 * 1024))
+
 
 def get_account_data(s3_url: str):
-    """Gets a XLS from the provided s3_url and returns a dict of account info."""
+    """Gets the account file from the provided s3_url and returns a list of account info."""
+
+    return list(iter_account_data(s3_url))
+
+
+def iter_account_data(s3_url: str, converters: dict = None):
+    """Gets the account file from the provided s3_url and yields the account info of every row.
+
+    The reader is picked from the file extension, see READERS. converters replaces COLUMN_CONVERTERS, pass {} to
+    get every value as a string, i.e. to tell blank cells apart.
+    """
+
+    bucket_name, object_key = parse_s3_url(s3_url)
+
+    reader = READERS.get(os.path.splitext(object_key)[1].lower())
+    if not reader:
+        raise Exception(
+            f"File format not supported, Only {', '.join(sorted(READERS))} formats are supported as of now."
+        )
+
+    return reader(bucket_name, object_key, converters)
+
 
+def parse_s3_url(s3_url: str):
     if "s3://" not in s3_url:
         raise ValueError(f"s3_url was set to {s3_url} and did not include s3://")
 
@@ -42,50 +73,329 @@ def get_account_data(s3_url: str):
     if not (bool(bucket_name) and bool(object_key)):
         raise ValueError(f"bucket_name or object_key is either None or Empty")
 
-    if not re.search(r"^\S+.xls$", object_key):
-        raise Exception(
-            "File format not supported, Only '.xsl' format is supported as of now."
-        )
-
-    xls = get_s3_data(bucket_name, object_key)
-    account_data = process_xls(xls)
-    return account_data
+    return bucket_name, object_key
 
 
 def get_s3_data(bucket_name, object_key):
     logger.info(f"Getting s3://{bucket_name}/{object_key}")
-    s3 = boto3.client("s3")
-    get_object = s3.get_object(Bucket=bucket_name, Key=object_key)
+    get_object = get_client("s3").get_object(Bucket=bucket_name, Key=object_key)
     file_content = get_object["Body"].read()
     return file_content
 
 
-def process_xls(xls: bytes):
-    workbook = open_workbook_xls(file_contents=xls)
-    worksheet = workbook.sheet_by_index(0)
-    first_row = [worksheet.cell_value(0, col) for col in range(worksheet.ncols)]
+def get_s3_stream(bucket_name, object_key):
+    """Returns a buffered binary stream over the object body, read from S3 in CHUNK_SIZE chunks."""
+
+    logger.info(f"Streaming s3://{bucket_name}/{object_key}")
+    get_object = get_client("s3").get_object(Bucket=bucket_name, Key=object_key)
+    return io.BufferedReader(_BodyReader(get_object["Body"]), buffer_size=CHUNK_SIZE)
+
+
+class _BodyReader(io.RawIOBase):
+    """Raw IO adapter over a botocore StreamingBody so it can be wrapped by the io buffers."""
+
+    def __init__(self, body):
+        self.body = body
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self.body.read(len(buffer))
+        buffer[: len(data)] = data
+        return len(data)
+
+    def close(self):
+        self.body.close()
+        super().close()
+
+
+def read_xls(bucket_name, object_key, converters: dict = None):
+    # Note: The XLS (BIFF) format can't be parsed from a stream, xlrd needs the whole file.
+    return process_xls(get_s3_data(bucket_name, object_key), converters=converters)
+
+
+def read_xlsx(bucket_name, object_key, converters: dict = None):
+    """Yields the account info of the first sheet of a XLSX file.
+
+    XLSX files are zip archives that can't be read from a stream, the object is spooled in chunks to a temporary
+    file and the sheet is read row by row from there.
+    """
+
+    with tempfile.TemporaryFile() as spool:
+        _spool_s3_object(bucket_name, object_key, spool)
+        yield from process_xlsx(spool, converters=converters)
+
+
+def read_csv(bucket_name, object_key, converters: dict = None):
+    """Yields the account info of every row of a CSV file with a header row."""
+
+    with get_s3_stream(bucket_name, object_key) as stream:
+        rows = csv.reader(io.TextIOWrapper(stream, encoding="utf-8-sig", newline=""))
+        header = next(rows, None)
+        if header:
+            yield from process_rows(header, _pad_rows(header, rows, ""), converters)
+
+
+def read_jsonl(bucket_name, object_key, converters: dict = None):
+    """Yields the account info of a JSON Lines file, one JSON object per line."""
+
+    with get_s3_stream(bucket_name, object_key) as stream:
+        for line in io.TextIOWrapper(stream, encoding="utf-8-sig"):
+            if line.strip():
+                yield process_record(json.loads(line), converters)
+
+
+def _pad_rows(header, rows, empty):
+    # Note: Skips blank rows and pads short rows so every record has all the header keys, as with XLS files.
+    width = len(header)
+    for row in rows:
+        if not any(value not in ("", None) for value in row):
+            continue
+        if len(row) < width:
+            row = list(row) + [empty] * (width - len(row))
+        yield row
+
+
+READERS = {
+    ".csv": read_csv,
+    ".jsonl": read_jsonl,
+    ".xls": read_xls,
+    ".xlsx": read_xlsx,
+}
+
+
+# Number of processes parsing the sheets of a workbook in parallel
+WORKBOOK_PROCESSES = int(os.environ.get("WORKBOOK_PROCESSES", os.cpu_count() or 1))
+
+
+def iter_workbook_sheets(s3_url: str):
+    """Yields the account info of every sheet of the file, one list per sheet in sheet order.
+
+    The sheets of XLS and XLSX workbooks are parsed in parallel processes, other formats are a single sheet.
+    """
+
+    bucket_name, object_key = parse_s3_url(s3_url)
+    extension = os.path.splitext(object_key)[1].lower()
+    if extension == ".xls":
+        xls = get_s3_data(bucket_name, object_key)
+        workbook = _open_xls(xls)
+        sheet_count = workbook.nsheets
+        workbook.release_resources()
+        yield from parse_sheets(_parse_xls_sheet, xls, sheet_count)
+    elif extension == ".xlsx":
+        # Note: The worker processes open the spooled file by name.
+        with tempfile.NamedTemporaryFile(suffix=".xlsx") as spool:
+            _spool_s3_object(bucket_name, object_key, spool)
+            workbook = _load_xlsx(spool.name)
+            sheet_count = len(workbook.sheetnames)
+            workbook.close()
+            yield from parse_sheets(_parse_xlsx_sheet, spool.name, sheet_count)
+    else:
+        yield list(iter_account_data(s3_url))
+
+
+def iter_accounts_by_company(sheets):
+    """Yields (CompanyName, account info) of the accounts of every sheet.
+
+    As in single company files, only the first account of a company must have the company name, accounts
+    without one belong to the company of the previous account of the same sheet.
+    """
+    for sheet in sheets:
+        company_name = None
+        for account in sheet:
+            company_name = account.get("CompanyName") or company_name
+            if not company_name:
+                logger.warning(
+                    f"Skipping AccountId {account.get('AccountId')}, no CompanyName before it in its sheet"
+                )
+                continue
+            yield company_name, account
+
+
+def parse_sheets(parse, source, sheet_count: int, processes: int = WORKBOOK_PROCESSES):
+    """Yields parse(source, sheet_index) of every sheet in sheet order, running up to processes sheets at once.
+
+    Note: multiprocessing Pool and Queue need /dev/shm which Lambda doesn't provide, each sheet gets its own
+    Process and sends its records back through a Pipe.
+    """
+
+    if sheet_count <= 1 or processes <= 1:
+        for index in range(sheet_count):
+            yield parse(source, index)
+        return
+
+    import multiprocessing
+
+    running = []
+    next_index = 0
+    try:
+        while running or next_index < sheet_count:
+            while next_index < sheet_count and len(running) < processes:
+                receiver, sender = multiprocessing.Pipe(duplex=False)
+                process = multiprocessing.Process(
+                    target=_parse_sheet_process,
+                    args=(parse, source, next_index, sender),
+                    daemon=True,
+                )
+                process.start()
+                sender.close()
+                running.append((process, receiver))
+                next_index += 1
+
+            process, receiver = running.pop(0)
+            # Note: Records are received before the join, a process blocks until its Pipe is read.
+            records = receiver.recv()
+            receiver.close()
+            process.join()
+            if isinstance(records, Exception):
+                raise records
+            yield records
+    finally:
+        for process, receiver in running:
+            process.terminate()
+            receiver.close()
+
+
+def _parse_sheet_process(parse, source, index, sender):
+    try:
+        sender.send(parse(source, index))
+    except Exception as ex:
+        sender.send(ex)
+    finally:
+        sender.close()
+
+
+def _parse_xls_sheet(xls: bytes, index: int) -> list:
+    return list(process_xls(xls, index))
+
+
+def _parse_xlsx_sheet(path: str, index: int) -> list:
+    return list(process_xlsx(path, index))
+
+
+def spool_rows(rows):
+    """Stages the rows as JSON lines in a temporary file and returns it rewound, see iter_spooled_rows."""
+
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE, mode="w+")
+    try:
+        for row in rows:
+            spool.write(json.dumps(row) + "\n")
+    except BaseException:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool
+
+
+def iter_spooled_rows(spool):
+    for line in spool:
+        yield json.loads(line)
+
+
+def _spool_s3_object(bucket_name, object_key, spool):
+    with get_s3_stream(bucket_name, object_key) as stream:
+        shutil.copyfileobj(stream, spool, CHUNK_SIZE)
+    spool.flush()
+    spool.seek(0)
+
+
+def _open_xls(xls: bytes):
+    # Note: xlrd and openpyxl are imported on first use, only the loaders read workbooks.
+    from xlrd.book import open_workbook_xls
+
+    return open_workbook_xls(file_contents=xls, on_demand=True)
+
+
+def _load_xlsx(file):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise Exception("openpyxl is required to read '.xlsx' files.")
+
+    return load_workbook(file, read_only=True, data_only=True)
+
+
+def process_xls(xls: bytes, sheet_index: int = 0, converters: dict = None):
+    """Yields one account record per row of the sheet, keyed by the header row."""
+
+    workbook = _open_xls(xls)
+    try:
+        worksheet = workbook.sheet_by_index(sheet_index)
+        if not worksheet.nrows:
+            return
+        rows = (worksheet.row_values(row) for row in range(1, worksheet.nrows))
+        yield from process_rows(worksheet.row_values(0), rows, converters)
+    finally:
+        workbook.release_resources()
+
+
+def process_xlsx(file, sheet_index: int = 0, converters: dict = None):
+    """Yields one account record per row of the XLSX sheet, keyed by the header row."""
+
+    workbook = _load_xlsx(file)
+    try:
+        rows = workbook.worksheets[sheet_index].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header:
+            yield from process_rows(header, _pad_rows(header, rows, None), converters)
+    finally:
+        workbook.close()
+
+
+def process_rows(header: list, rows, converters: dict = None):
+    """Converts rows of cell values to account records, the converter of each column is picked once from the header."""
+
+    converters = COLUMN_CONVERTERS if converters is None else converters
+    columns = [(key, converters.get(key, to_str)) for key in header]
+    defaults = {
+        key: value for key, value in COLUMN_DEFAULTS.items() if key not in header
+    }
+    for row in rows:
+        yield {
+            **defaults,
+            **{key: convert(value) for (key, convert), value in zip(columns, row)},
+        }
+
+
+def process_record(record: dict, converters: dict = None):
+    """Converts a record read from a JSON line to the account info shape of the other readers."""
+
+    converters = COLUMN_CONVERTERS if converters is None else converters
+    account_info = {}
+    for key, value in record.items():
+        if isinstance(value, (dict, list)):
+            value = json.dumps(value)
+        account_info[key] = converters.get(key, to_str)(value)
+    for key, value in COLUMN_DEFAULTS.items():
+        account_info.setdefault(key, value)
+    return account_info
+
+
+def to_str(value) -> str:
+    if type(value) is str:
+        return value
+    if value is None:
+        return ""
+    if type(value) is float:
+        return str(int(value))
+    return str(value)
+
+
+def to_account_id(value) -> str:
+    return to_str(value).zfill(12)
 
-    account_info_list = []
-    for row in range(1, worksheet.nrows):
-        account_info = dict({})
-        for col in range(worksheet.ncols):
-            key = first_row[col]
-            value = worksheet.cell_value(row, col)
-            if type(value) is float:
-                value = str(int(value))
-            elif type(value) is not str:
-                value = str(value)
 
-            if key == "AccountId":
-                value = value.zfill(12)
+def to_bool(value) -> bool:
+    return to_str(value).lower() in ["true", "1"]
 
-            if key == "Migrate":
-                if value.lower() in ["true", "1"]:
-                    value = True
-                else:
-                    value = False
 
-            account_info[key] = value
-        account_info_list.append(account_info)
+COLUMN_CONVERTERS = {
+    "AccountId": to_account_id,
+    "Migrate": to_bool,
+}
 
-    return account_info_list
+# Values of the optional columns missing from a file
+COLUMN_DEFAULTS = {
+    "SlackHandle": "",
+}
@@ -17,47 +17,523 @@
 """
 
 import logging
+import os
+import queue
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from copy import deepcopy
 from datetime import datetime
 
-import boto3
+from botocore.exceptions import ClientError
+
+from utils.clients import get_resource
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
+SCAN_SEGMENTS = int(os.environ.get("SCAN_SEGMENTS", 4))
+# Attribute used for optimistic locking of tracked items
+VERSION_ATTRIBUTE = "Version"
+UPDATE_RETRIES = 3
+# BatchGetItem limits
+BATCH_GET_SIZE = 100
+BATCH_GET_RETRIES = 8
+# BatchWriteItem limits
+BATCH_WRITE_SIZE = 25
+BATCH_WRITE_RETRIES = 8
+BATCH_WRITE_WORKERS = int(os.environ.get("BATCH_WRITE_WORKERS", 4))
+# Progress of bulk writes is logged every PROGRESS_INTERVAL items
+PROGRESS_INTERVAL = 1000
+# Errors of a whole BatchWriteItem call that are retried like unprocessed items
+THROTTLING_ERRORS = [
+    "ProvisionedThroughputExceededException",
+    "ThrottlingException",
+    "RequestLimitExceeded",
+]
+
+
+class TrackedItem(dict):
+    """Item that remembers its attributes as read, so update_item only writes the attributes that changed."""
+
+    def __init__(
+        self, item: dict, key_attributes: tuple = ("CompanyName", "AccountId")
+    ):
+        super().__init__(item)
+        self.key_attributes = key_attributes
+        self.original = deepcopy(item)
+
+    @property
+    def key(self) -> dict:
+        return {attribute: self[attribute] for attribute in self.key_attributes}
+
+    def changes(self):
+        """Returns (dict of changed or added attributes, set of removed attributes)."""
+        changed = {
+            k: v
+            for k, v in self.items()
+            if k not in self.key_attributes
+            and (k not in self.original or self.original[k] != v)
+        }
+        removed = {k for k in self.original if k not in self}
+        return changed, removed
+
+    def mark_clean(self):
+        self.original = deepcopy(dict(self))
+
+
+def track(item: dict, key_attributes: tuple = ("CompanyName", "AccountId")):
+    return TrackedItem(item, key_attributes) if item is not None else None
+
+
+def batch_write(
+    table, items, is_account_data=False, workers: int = BATCH_WRITE_WORKERS
+) -> dict:
+    """Writes the items with BatchWriteItem from worker threads, each with its own DynamoDB resource.
+
+    items can be a generator, it is consumed by the calling thread and handed to the workers in batches of 25.
+    Unprocessed and throttled items are retried with exponential backoff and jitter, items still not written after
+    BATCH_WRITE_RETRIES attempts or rejected by DynamoDB are counted as failed and logged.
+    Returns the Written and Failed counts, the elapsed Seconds and the same figures for each worker partition.
+    """
+    start = time.monotonic()
+    batches = queue.Queue(maxsize=workers * 2)
+    progress = {"Written": 0, "Logged": 0}
+    progress_lock = threading.Lock()
+
+    def write_partition(partition):
+        stats = {
+            "Partition": partition,
+            "Batches": 0,
+            "Written": 0,
+            "Failed": 0,
+            "Retries": 0,
+            "Seconds": 0.0,
+        }
+        while True:
+            batch = batches.get()
+            if batch is None:
+                return stats
+            batch_start = time.monotonic()
+            try:
+                written, failed, retries = _write_batch(table, batch)
+            except Exception as ex:
+                # Note: A worker must keep draining the bounded queue, otherwise the producer blocks forever.
+                logger.error(f"Failed to write {len(batch)} items to {table}: {ex!r}")
+                written, failed, retries = 0, len(batch), 0
+            stats["Batches"] += 1
+            stats["Written"] += written
+            stats["Failed"] += failed
+            stats["Retries"] += retries
+            stats["Seconds"] += time.monotonic() - batch_start
+
+            with progress_lock:
+                progress["Written"] += written
+                if progress["Written"] - progress["Logged"] >= PROGRESS_INTERVAL:
+                    progress["Logged"] = progress["Written"]
+                    logger.info(f"Written {progress['Written']} items to {table}")
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(write_partition, i) for i in range(workers)]
+        try:
+            batch = []
+            for item in items:
+                # if target account data then add extra column
+                if is_account_data:
+                    item["AccountStatus"] = 0
+                    item["AccountId"] = item["AccountId"].zfill(12)
+                    item["IsPermissionsScanned"] = False
+                    item["LastUpdatedOn"] = datetime.utcnow().isoformat()
+                batch.append({"PutRequest": {"Item": convert_empty_values(item)}})
+                if len(batch) == BATCH_WRITE_SIZE:
+                    batches.put(batch)
+                    batch = []
+            if batch:
+                batches.put(batch)
+        finally:
+            # Note: Workers stop once they have written the batches queued before their sentinel.
+            for _ in futures:
+                batches.put(None)
+        partitions = [future.result() for future in futures]
+
+    result = {
+        "Written": sum(partition["Written"] for partition in partitions),
+        "Failed": sum(partition["Failed"] for partition in partitions),
+        "Seconds": round(time.monotonic() - start, 3),
+        "Partitions": partitions,
+    }
+    for partition in partitions:
+        partition["Seconds"] = round(partition["Seconds"], 3)
+    logger.info(
+        f"Written {result['Written']} items to {table} in {result['Seconds']}s, {result['Failed']} failed"
+    )
+    return result
+
 
-def batch_write(table, items, is_account_data=False):
-    with get_db(table).batch_writer() as batch:
-        for item in items:
-            # if target account data then add extra column
-            if is_account_data:
-                item["AccountStatus"] = 0
-                item["AccountId"] = item["AccountId"].zfill(12)
-                item["IsPermissionsScanned"] = False
-                item["LastUpdatedOn"] = datetime.utcnow().isoformat()
-            batch.put_item(Item=convert_empty_values(item))
+def _write_batch(table, requests: list):
+    """Writes a batch of put requests, returns the number of written and failed items and the retries needed."""
+
+    total = len(requests)
+    dynamodb = get_resource("dynamodb")
+    for attempt in range(BATCH_WRITE_RETRIES):
+        try:
+            response = dynamodb.batch_write_item(RequestItems={table: requests})
+            unprocessed = response.get("UnprocessedItems", {}).get(table, [])
+        except ClientError as ce:
+            if ce.response["Error"]["Code"] not in THROTTLING_ERRORS:
+                logger.error(f"Failed to write {len(requests)} items to {table}: {ce}")
+                return total - len(requests), len(requests), attempt
+            unprocessed = requests
+
+        if not unprocessed:
+            return total, 0, attempt
+        if attempt == BATCH_WRITE_RETRIES - 1:
+            keys = [
+                request["PutRequest"]["Item"].get("AccountId")
+                for request in unprocessed
+            ]
+            logger.error(
+                f"{len(unprocessed)} items of {table} still unprocessed after {BATCH_WRITE_RETRIES} attempts: {keys}"
+            )
+            return total - len(unprocessed), len(unprocessed), attempt
+
+        delay = random.uniform(0, min(5, 0.05 * 2**attempt))
+        logger.debug(
+            f"Retrying {len(unprocessed)} unprocessed items of {table} in {delay:.2f}s"
+        )
+        time.sleep(delay)
+        requests = unprocessed
 
 
 def update_item(table, item):
+    """Writes the item, only the changed attributes are written when item is a TrackedItem.
+
+    Tracked items are written with a version check, if someone else updated the item in the meantime the write is
+    retried as long as the other writer didn't touch the same attributes. Other items are put whole, on the condition
+    that the stored Version is still the item's one, or that there is no stored Version if the item has none.
+    """
+    if not isinstance(item, TrackedItem):
+        version = item.get(VERSION_ATTRIBUTE)
+        item["LastUpdatedOn"] = datetime.utcnow().isoformat()
+        item[VERSION_ATTRIBUTE] = (version or 0) + 1
+        try:
+            get_db(table).put_item(
+                Item=convert_empty_values(item), **build_put_condition(version)
+            )
+        except ClientError as ce:
+            item[VERSION_ATTRIBUTE] = version
+            raise ce
+        return
+
+    changed, removed = item.changes()
+    changed.pop(VERSION_ATTRIBUTE, None)
+    if not changed and not removed:
+        logger.debug(f"No changes to write for {item.key}")
+        return
+
     item["LastUpdatedOn"] = datetime.utcnow().isoformat()
-    get_db(table).put_item(Item=convert_empty_values(item))
+    changed["LastUpdatedOn"] = item["LastUpdatedOn"]
+    version = item.original.get(VERSION_ATTRIBUTE)
+
+    for attempt in range(UPDATE_RETRIES):
+        try:
+            response = get_db(table).update_item(
+                Key=item.key,
+                ReturnValues="ALL_NEW",
+                **build_update_expression(
+                    changed, removed, version, item.key_attributes[0]
+                ),
+            )
+            break
+        except ClientError as ce:
+            if (
+                ce.response["Error"]["Code"] != "ConditionalCheckFailedException"
+                or attempt == UPDATE_RETRIES - 1
+            ):
+                raise ce
+            current = (
+                get_db(table).get_item(Key=item.key, ConsistentRead=True).get("Item")
+            )
+            if current is None:
+                logger.error(f"Item {item.key} was deleted, not updating it")
+                raise ce
+            conflicts = [
+                attribute
+                for attribute in set(changed) | removed
+                if attribute != "LastUpdatedOn"
+                and _empty_as_none(current.get(attribute))
+                != _empty_as_none(item.original.get(attribute))
+            ]
+            if conflicts:
+                logger.error(f"Concurrent update of {conflicts} for {item.key}")
+                raise ce
+            version = current.get(VERSION_ATTRIBUTE)
+            logger.info(f"Retrying update of {item.key} on version {version}")
+
+    item.clear()
+    item.update(response["Attributes"])
+    item.mark_clean()
+
+
+def _empty_as_none(value):
+    return None if value == "" else value
+
+
+def build_update_expression(
+    changed: dict, removed: set, version, partition_key: str
+) -> dict:
+    """Returns the UpdateItem arguments, the condition makes the update fail instead of creating a missing item."""
+    names = {"#ver": VERSION_ATTRIBUTE}
+    values = {":one": 1, ":zero": 0}
+    set_actions = ["#ver = if_not_exists(#ver, :zero) + :one"]
+    remove_actions = []
+
+    changed = convert_empty_values(changed)
+    for index, (attribute, value) in enumerate(changed.items()):
+        names[f"#s{index}"] = attribute
+        values[f":s{index}"] = value
+        set_actions.append(f"#s{index} = :s{index}")
+    for index, attribute in enumerate(removed):
+        names[f"#r{index}"] = attribute
+        remove_actions.append(f"#r{index}")
+
+    update_expression = f"SET {', '.join(set_actions)}"
+    if remove_actions:
+        update_expression += f" REMOVE {', '.join(remove_actions)}"
+
+    if version is None:
+        condition_expression = "attribute_exists(#pk) AND attribute_not_exists(#ver)"
+        names["#pk"] = partition_key
+    else:
+        condition_expression = "#ver = :ver"
+        values[":ver"] = version
+
+    return {
+        "UpdateExpression": update_expression,
+        "ConditionExpression": condition_expression,
+        "ExpressionAttributeNames": names,
+        "ExpressionAttributeValues": values,
+    }
+
+
+def build_put_condition(version) -> dict:
+    """Returns the PutItem condition arguments of an item read with version, None if it has no Version."""
+    if version is None:
+        return {
+            "ConditionExpression": "attribute_not_exists(#ver)",
+            "ExpressionAttributeNames": {"#ver": VERSION_ATTRIBUTE},
+        }
+    return {
+        "ConditionExpression": "#ver = :ver",
+        "ExpressionAttributeNames": {"#ver": VERSION_ATTRIBUTE},
+        "ExpressionAttributeValues": {":ver": version},
+    }
+
+
+def query_items(table, projection: list = None, page_size: int = None, **kwargs):
+    """Yields every item matching the query, following LastEvaluatedKey across pages.
+
+    :param table: DynamoDB table name
+    :param projection: Optional list of attribute names to read
+    :param page_size: Optional number of items to evaluate per page (Limit)
+    :param kwargs: Any other Table.query argument i.e. KeyConditionExpression, IndexName, FilterExpression
+    """
+    return _paginate(get_db(table).query, projection, page_size, kwargs)
+
+
+def scan_items(table, projection: list = None, page_size: int = None, **kwargs):
+    """Yields every item of the table, following LastEvaluatedKey across pages."""
+    return _paginate(get_db(table).scan, projection, page_size, kwargs)
+
+
+def parallel_scan_items(
+    table,
+    total_segments: int = SCAN_SEGMENTS,
+    projection: list = None,
+    page_size: int = None,
+    stats: dict = None,
+    **kwargs,
+):
+    """Yields every item of the table, scanning total_segments segments concurrently.
+
+    Each segment is scanned by its own thread and follows LastEvaluatedKey, pages are merged into this single
+    iterator as they arrive so item order is not guaranteed.
+    If stats dict is provided, it's updated with the number of items and the read capacity consumed.
+    """
+    if projection:
+        add_projection(kwargs, projection)
+    if page_size:
+        kwargs["Limit"] = page_size
+
+    stats = {} if stats is None else stats
+    stats.update({"Items": 0, "ConsumedCapacity": 0.0, "Segments": total_segments})
+    stats_lock = threading.Lock()
+    # Note: Bounded so that a slow consumer doesn't end up holding the whole table in memory.
+    pages = queue.Queue(maxsize=total_segments * 2)
+    stop = threading.Event()
+
+    def put(page):
+        while not stop.is_set():
+            try:
+                pages.put(page, timeout=1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def scan_segment(segment):
+        try:
+            db = get_db(table)
+            segment_kwargs = dict(
+                kwargs,
+                Segment=segment,
+                TotalSegments=total_segments,
+                ReturnConsumedCapacity="TOTAL",
+            )
+            while not stop.is_set():
+                response = db.scan(**segment_kwargs)
+                with stats_lock:
+                    stats["ConsumedCapacity"] += response.get(
+                        "ConsumedCapacity", {}
+                    ).get("CapacityUnits", 0)
+                if not put(response.get("Items", [])):
+                    return
+                last_evaluated_key = response.get("LastEvaluatedKey")
+                if not last_evaluated_key:
+                    break
+                segment_kwargs["ExclusiveStartKey"] = last_evaluated_key
+            put(None)
+        except Exception as ex:
+            put(ex)
+
+    with ThreadPoolExecutor(max_workers=total_segments) as executor:
+        for segment in range(total_segments):
+            executor.submit(scan_segment, segment)
+        try:
+            completed_segments = 0
+            while completed_segments < total_segments:
+                page = pages.get()
+                if page is None:
+                    completed_segments += 1
+                    continue
+                if isinstance(page, Exception):
+                    raise page
+                with stats_lock:
+                    stats["Items"] += len(page)
+                yield from page
+        finally:
+            stop.set()
+
+    logger.info(f"Parallel scan of {table} completed: {stats}")
+
+
+def batch_get_items(table, keys: list, projection: list = None):
+    """Yields the items for the given keys using BatchGetItem, 100 keys per call.
+
+    UnprocessedKeys are retried with exponential backoff and jitter, keys that don't exist are simply not returned.
+    """
+    # Note: BatchGetItem rejects duplicate keys in the same request
+    unique_keys = list({tuple(sorted(key.items())): key for key in keys}.values())
+    dynamodb = get_resource("dynamodb")
+
+    for start in range(0, len(unique_keys), BATCH_GET_SIZE):
+        request = {"Keys": unique_keys[start : start + BATCH_GET_SIZE]}
+        if projection:
+            add_projection(request, projection)
+
+        for attempt in range(BATCH_GET_RETRIES):
+            response = dynamodb.batch_get_item(RequestItems={table: request})
+            yield from response.get("Responses", {}).get(table, [])
+
+            request = response.get("UnprocessedKeys", {}).get(table)
+            if not request:
+                break
+            if attempt == BATCH_GET_RETRIES - 1:
+                raise Exception(
+                    f"{len(request['Keys'])} keys of {table} still unprocessed after {BATCH_GET_RETRIES} attempts"
+                )
+            delay = random.uniform(0, min(5, 0.05 * 2**attempt))
+            logger.info(
+                f"Retrying {len(request['Keys'])} unprocessed keys of {table} in {delay:.2f}s"
+            )
+            time.sleep(delay)
+
+
+def _paginate(operation, projection, page_size, kwargs):
+    if projection:
+        add_projection(kwargs, projection)
+    if page_size:
+        kwargs["Limit"] = page_size
+
+    while True:
+        response = operation(**kwargs)
+        yield from response.get("Items", [])
+        last_evaluated_key = response.get("LastEvaluatedKey")
+        if not last_evaluated_key:
+            break
+        kwargs["ExclusiveStartKey"] = last_evaluated_key
+
+
+def add_projection(kwargs: dict, projection: list):
+    """Adds a ProjectionExpression using attribute name placeholders, so reserved words can be projected too."""
+    names = kwargs.setdefault("ExpressionAttributeNames", {})
+    placeholders = []
+    for index, attribute in enumerate(projection):
+        placeholder = f"#p{index}"
+        names[placeholder] = attribute
+        placeholders.append(placeholder)
+    kwargs["ProjectionExpression"] = ", ".join(placeholders)
+    return kwargs
 
 
 def get_db(table):
-    db_client = boto3.resource("dynamodb")
-    return db_client.Table(table)
+    return get_resource("dynamodb").Table(table)
 
 
 # Note: Python AWS sdk doesn't support "convertEmptyValues"
 # iftik: This util function should take care of empty string in inset record.
 # Added fix for nested list
-def convert_empty_values(d):
-    for k in d:
-        if isinstance(d[k], dict):
-            convert_empty_values(d[k])
-        elif isinstance(d[k], list):
-            for i in d[k]:
-                if isinstance(i, list) or isinstance(i, dict):
-                    convert_empty_values(i)
-        elif d[k] == "":
-            d[k] = None
-    return d
+def convert_empty_values(value):
+    """Returns value with every empty string, at any depth, replaced by None. value itself is never modified.
+
+    The structure is walked with an explicit stack instead of recursion, containers without an empty string are
+    returned as is and only the containers on the path to an empty string are copied.
+    """
+    if isinstance(value, str):
+        return None if value == "" else value
+    if not isinstance(value, (dict, list)):
+        return value
+
+    # Frame: (container, key in parent container, iterator over the container entries, replaced entries)
+    stack = [(value, None, _entries(value), {})]
+    while True:
+        container, key, entries, replaced = stack[-1]
+        for child_key, child in entries:
+            if isinstance(child, str):
+                if child == "":
+                    replaced[child_key] = None
+            elif child and isinstance(child, (dict, list)):
+                stack.append((child, child_key, _entries(child), {}))
+                break
+        else:
+            stack.pop()
+            if replaced:
+                container = _replace_entries(container, replaced)
+            if not stack:
+                return container
+            if replaced:
+                stack[-1][3][key] = container
+
+
+def _entries(container):
+    return iter(
+        container.items() if isinstance(container, dict) else enumerate(container)
+    )
+
+
+def _replace_entries(container, replaced: dict):
+    container = container.copy()
+    for key, value in replaced.items():
+        container[key] = value
+    return container
@@ -0,0 +1,90 @@
+"""
+  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+  Licensed under the Apache License, Version 2.0 (the "License").
+  You may not use this file except in compliance with the License.
+  You may obtain a copy of the License at
+
+      http://www.apache.org/licenses/LICENSE-2.0
+
+  Unless required by applicable law or agreed to in writing, software
+  distributed under the License is distributed on an "AS IS" BASIS,
+  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+  See the License for the specific language governing permissions and
+  limitations under the License.
+
+  @author iftikhan
+  @description: Snapshot of the ACTIVE Access Analyzer findings per account and region, kept gzipped in the shared
+    bucket. Rescans only read the findings updated since the snapshot's Watermark and apply them as a delta.
+"""
+
+import gzip
+import json
+import logging
+from datetime import datetime
+
+from utils.clients import get_client
+from utils.ingestion_cache import get_object
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+SNAPSHOT_PREFIX = "findings_snapshot"
+
+
+def new_snapshot(analyzer_arn: str) -> dict:
+    # Findings: {finding id: {"resource", "condition"}}, Exposed: resources notified as exposed
+    return {
+        "AnalyzerArn": analyzer_arn,
+        "Watermark": None,
+        "Findings": {},
+        "Exposed": [],
+    }
+
+
+def get_snapshot(bucket_name: str, account_id: str, region: str):
+    data = get_object(bucket_name, f"{SNAPSHOT_PREFIX}/{account_id}/{region}.json.gz")
+    return json.loads(gzip.decompress(data)) if data else None
+
+
+def save_snapshot(bucket_name: str, account_id: str, region: str, snapshot: dict):
+    get_client("s3").put_object(
+        Body=gzip.compress(json.dumps(snapshot).encode("utf-8")),
+        Bucket=bucket_name,
+        Key=f"{SNAPSHOT_PREFIX}/{account_id}/{region}.json.gz",
+    )
+
+
+def get_watermark(snapshot: dict):
+    return (
+        datetime.fromisoformat(snapshot["Watermark"]) if snapshot["Watermark"] else None
+    )
+
+
+def apply_findings(snapshot: dict, findings) -> int:
+    """Applies the findings to the snapshot, ACTIVE ones are kept and the others removed.
+
+    Returns the number of findings that changed the snapshot.
+    """
+
+    previous_watermark = get_watermark(snapshot)
+    watermark = previous_watermark
+    changed = 0
+    for finding in findings:
+        updated_at = finding["updatedAt"]
+        if finding["status"] == "ACTIVE":
+            entry = {
+                "resource": finding["resource"],
+                "condition": finding.get("condition") or {},
+            }
+            is_changed = snapshot["Findings"].get(finding["id"]) != entry
+            snapshot["Findings"][finding["id"]] = entry
+        else:
+            is_changed = snapshot["Findings"].pop(finding["id"], None) is not None
+        # Note: Findings at the watermark are read again by every rescan, they only count if they changed.
+        if is_changed or not previous_watermark or updated_at > previous_watermark:
+            changed += 1
+        if not watermark or updated_at > watermark:
+            watermark = updated_at
+    snapshot["Watermark"] = watermark.isoformat() if watermark else None
+    return changed
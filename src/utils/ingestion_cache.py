@@ -0,0 +1,105 @@
+"""
+  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+  Licensed under the Apache License, Version 2.0 (the "License").
+  You may not use this file except in compliance with the License.
+  You may obtain a copy of the License at
+
+      http://www.apache.org/licenses/LICENSE-2.0
+
+  Unless required by applicable law or agreed to in writing, software
+  distributed under the License is distributed on an "AS IS" BASIS,
+  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+  See the License for the specific language governing permissions and
+  limitations under the License.
+
+  @author iftikhan
+  @description: Cache of the last ingested account file per company, kept in the shared bucket. The manifest holds
+    the ETag and VersionId of the file, the index holds the ContentHash of every account loaded from it.
+"""
+
+import gzip
+import json
+import logging
+
+from botocore.exceptions import ClientError
+
+from utils.clients import get_client
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+CACHE_PREFIX = "ingestion_cache"
+
+
+def get_file_version(bucket_name: str, object_key: str) -> dict:
+    """Returns the ETag and VersionId (None if the bucket isn't versioned) of the object with a head_object call."""
+
+    obj = get_client("s3").head_object(Bucket=bucket_name, Key=object_key)
+    return {"ETag": obj["ETag"], "VersionId": obj.get("VersionId")}
+
+
+def is_unchanged(manifest: dict, object_key: str, file_version: dict) -> bool:
+    return (
+        bool(manifest)
+        and manifest.get("File") == object_key
+        and all(manifest.get(key) == value for key, value in file_version.items())
+    )
+
+
+def get_manifest(bucket_name: str, company_name: str):
+    data = get_object(bucket_name, f"{CACHE_PREFIX}/{company_name}/manifest.json")
+    return json.loads(data) if data else None
+
+
+def get_hash_index(bucket_name: str, company_name: str):
+    """Returns the {AccountId: ContentHash} index of the last ingested file, None if there is no cache."""
+
+    data = get_object(bucket_name, f"{CACHE_PREFIX}/{company_name}/accounts.json.gz")
+    return json.loads(gzip.decompress(data)) if data else None
+
+
+def save_cache(bucket_name: str, company_name: str, manifest: dict, hash_index: dict):
+    s3_client = get_client("s3")
+    s3_client.put_object(
+        Body=gzip.compress(json.dumps(hash_index).encode("utf-8")),
+        Bucket=bucket_name,
+        Key=f"{CACHE_PREFIX}/{company_name}/accounts.json.gz",
+    )
+    # Note: The manifest is written last, so it never points at a file whose index wasn't saved.
+    s3_client.put_object(
+        Body=json.dumps(manifest).encode("utf-8"),
+        Bucket=bucket_name,
+        Key=f"{CACHE_PREFIX}/{company_name}/manifest.json",
+        ContentType="application/json",
+    )
+    logger.info(
+        f"Saved ingestion cache of company {company_name} for {manifest.get('File')}"
+    )
+
+
+def clear_cache(bucket_name: str, company_name: str):
+    """Removes the company's cache, so the next load of any file reads it in full and diffs it against the table."""
+
+    s3_client = get_client("s3")
+    # Note: The manifest is removed first, so a cache without manifest is never used.
+    for name in ["manifest.json", "accounts.json.gz"]:
+        s3_client.delete_object(
+            Bucket=bucket_name, Key=f"{CACHE_PREFIX}/{company_name}/{name}"
+        )
+    logger.info(f"Cleared ingestion cache of company {company_name}")
+
+
+def get_object(bucket_name: str, object_key: str):
+    """Returns the object's data, None if the object doesn't exist."""
+
+    try:
+        return (
+            get_client("s3")
+            .get_object(Bucket=bucket_name, Key=object_key)["Body"]
+            .read()
+        )
+    except ClientError as ce:
+        if ce.response["Error"]["Code"] in ["NoSuchKey", "404"]:
+            return None
+        raise ce
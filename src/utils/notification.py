@@ -18,15 +18,14 @@
 
 import logging
 
-import boto3
+from utils.clients import get_resource
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
 
 def notify_msg(topic, subject, message):
-    sns = boto3.resource("sns")
-    topic = sns.Topic(topic)
+    topic = get_resource("sns").Topic(topic)
     if type(message).__name__.__ne__("str"):
         message = str(message)
     topic.publish(Message=message, Subject=subject, MessageStructure="string")
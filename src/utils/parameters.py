@@ -18,13 +18,36 @@
 
 import logging
 
-import boto3
+from utils.clients import get_client
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
+# GetParameters accepts at most 10 names per call
+GET_PARAMETERS_SIZE = 10
+
 
 def get_secured_parameter(param_name, is_secured):
-    ssm = boto3.client("ssm")
-    response = ssm.get_parameter(Name=param_name, WithDecryption=is_secured)
+    response = get_client("ssm").get_parameter(
+        Name=param_name, WithDecryption=is_secured
+    )
     return response["Parameter"].get("Value")
+
+
+def get_parameters(param_names: list, with_decryption: bool = False):
+    """Fetches many parameters with GetParameters, 10 names per call.
+
+    Returns a dict of the values by name and the list of names that don't exist.
+    """
+    values = {}
+    invalid_names = []
+    ssm_client = get_client("ssm")
+    for start in range(0, len(param_names), GET_PARAMETERS_SIZE):
+        response = ssm_client.get_parameters(
+            Names=param_names[start : start + GET_PARAMETERS_SIZE],
+            WithDecryption=with_decryption,
+        )
+        for parameter in response["Parameters"]:
+            values[parameter["Name"]] = parameter.get("Value")
+        invalid_names.extend(response.get("InvalidParameters", []))
+    return values, invalid_names
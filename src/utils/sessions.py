@@ -18,37 +18,153 @@
 """
 
 import logging
+import threading
+import weakref
 
 import boto3.session
+import botocore.session
+from botocore.credentials import RefreshableCredentials
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
+# Note: 3600 sec is the maximum allowed duration for role chaining and the minimum MaxSessionDuration of any role,
+# so it is always accepted by STS.
+SESSION_DURATION = 3600
+# Credentials are refreshed once they are within this many seconds of expiring.
+REFRESH_WINDOW = 300
+
+# Per container cache of assumed role sessions keyed by (role_arn, source_identity, session_name)
+_session_cache = {}
+_session_cache_lock = threading.Lock()
+_session_cache_stats = {"Hits": 0, "Misses": 0}
+# Identity of the sessions handed out by get_session, used as source identity when hopping through them.
+_session_identities = weakref.WeakKeyDictionary()
+# Note: Built on first use instead of at import, creating a session loads the botocore config and credentials chain.
+_default_session = None
+
+
+class _AssumeRoleCredentials(RefreshableCredentials):
+    _advisory_refresh_timeout = REFRESH_WINDOW
+    _mandatory_refresh_timeout = REFRESH_WINDOW // 2
+
+
+def get_default_session():
+    """Returns the container's session for the Lambda's own role, shared by every client and role hop."""
+
+    global _default_session
+    if not _default_session:
+        with _session_cache_lock:
+            if not _default_session:
+                _default_session = boto3.session.Session()
+    return _default_session
+
 
 def get_session(
-    role_arn, session=boto3.session.Session(), session_name="AccountMigrationEngine"
+    role_arn,
+    session=None,
+    session_name="AccountMigrationEngine",
+    cached=True,
 ):
     """Assumes a role and returns a boto3.session.Session() for that role.
 
     if session is provided will use that session for the basis of assuming the role.
     This is useful when "hopping" through master accounts to linked accounts.
 
+    Sessions are cached per container and their credentials are refreshed automatically shortly before they expire.
+    Use cached=False when the assume role call itself is the check (i.e. probing if a role is still usable).
     """
-    sts = session.client("sts")
-    get_caller_identity = sts.get_caller_identity()
-    logger.info(f"Getting session for {role_arn} as {get_caller_identity['Arn']}")
+    session = session or get_default_session()
+    source_identity = get_source_identity(session)
+    cache_key = (role_arn, source_identity, session_name)
+
+    if cached:
+        with _session_cache_lock:
+            role_session = _session_cache.get(cache_key)
+            _session_cache_stats["Hits" if role_session else "Misses"] += 1
+        if role_session:
+            logger.debug(f"Reusing cached session for {role_arn} via {source_identity}")
+            return role_session
+
+    if logger.isEnabledFor(logging.DEBUG):
+        get_caller_identity = session.client("sts").get_caller_identity()
+        logger.debug(f"Getting session for {role_arn} as {get_caller_identity['Arn']}")
+    else:
+        logger.info(f"Getting session for {role_arn}")
 
     sts = session.client("sts")
-    assume_role_response = sts.assume_role(
-        DurationSeconds=900, RoleArn=role_arn, RoleSessionName=session_name
-    )
 
-    role_keys = assume_role_response["Credentials"]
-    session = boto3.session.Session(
-        aws_access_key_id=role_keys["AccessKeyId"],
-        aws_secret_access_key=role_keys["SecretAccessKey"],
-        aws_session_token=role_keys["SessionToken"],
+    def refresh():
+        assume_role_response = sts.assume_role(
+            DurationSeconds=SESSION_DURATION,
+            RoleArn=role_arn,
+            RoleSessionName=session_name,
+        )
+        role_keys = assume_role_response["Credentials"]
+        logger.debug(f"Got credentials with AccessKeyId {role_keys['AccessKeyId']}")
+        return {
+            "access_key": role_keys["AccessKeyId"],
+            "secret_key": role_keys["SecretAccessKey"],
+            "token": role_keys["SessionToken"],
+            "expiry_time": role_keys["Expiration"].isoformat(),
+        }
+
+    # Note: Credentials are fetched right away so that callers still get the ClientError from get_session.
+    credentials = _AssumeRoleCredentials.create_from_metadata(
+        metadata=refresh(), refresh_using=refresh, method="sts-assume-role"
     )
-    logger.debug(f"Got boto3 Session with AccessKeyId {role_keys['AccessKeyId']}")
+    botocore_session = botocore.session.get_session()
+    botocore_session._credentials = credentials
+    role_session = boto3.session.Session(botocore_session=botocore_session)
+    _session_identities[role_session] = role_arn
+
+    if cached:
+        with _session_cache_lock:
+            _session_cache[cache_key] = role_session
+
+    return role_session
+
+
+def get_source_identity(session) -> str:
+    """Returns a cheap identity for the session without calling sts get_caller_identity."""
+
+    identity = _session_identities.get(session)
+    if identity:
+        return identity
+    credentials = session.get_credentials()
+    return credentials.access_key if credentials else None
+
+
+def clear_session_cache():
+    with _session_cache_lock:
+        _session_cache.clear()
+        _session_cache_stats.update({"Hits": 0, "Misses": 0})
+
+
+class SessionPool:
+    """Role chain sessions shared by all the accounts a warm container processes, a view over the get_session cache.
+
+    Linked account sessions are built from the cached master hop session, so the master's AdminRole is not assumed
+    again for every linked account.
+    """
+
+    def get_master_session(self, master_role_arn):
+        return get_session(master_role_arn)
+
+    def get_linked_session(self, master_role_arn, role_arn):
+        return get_session(role_arn, self.get_master_session(master_role_arn))
+
+    def stats(self) -> dict:
+        with _session_cache_lock:
+            return {**_session_cache_stats, "Sessions": len(_session_cache)}
+
+    def log_stats(self):
+        """Logs the container's hit/miss counters, once per invocation of a fan-out item."""
+
+        logger.info(f"Session pool stats: {self.stats()}")
+
+    def clear(self):
+        clear_session_cache()
+
 
-    return session
+session_pool = SessionPool()
@@ -0,0 +1,164 @@
+"""
+  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+  Licensed under the Apache License, Version 2.0 (the "License").
+  You may not use this file except in compliance with the License.
+  You may obtain a copy of the License at
+
+      http://www.apache.org/licenses/LICENSE-2.0
+
+  Unless required by applicable law or agreed to in writing, software
+  distributed under the License is distributed on an "AS IS" BASIS,
+  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+  See the License for the specific language governing permissions and
+  limitations under the License.
+
+  @author iftikhan
+  @description: Validation of the account input rows against a declarative schema, the schema is compiled once to a
+    list of checks per column so every row is validated in a single pass.
+"""
+
+import logging
+import re
+
+from constant import Constant
+
+logger = logging.getLogger(__name__)
+logger.setLevel(getattr(logging, Constant.LOG_LEVEL))
+
+# Row number of the first account in the input file as shown by a spreadsheet, the header is row 1
+FIRST_ROW = 2
+
+# Rules supported per column:
+#   required: the value can't be empty
+#   pattern: the value must fully match the regex
+#   choices: the value must be one of the given values
+#   unique: the value can't be repeated across rows
+#   max_count: {value: n}, a value can't be used by more than n rows
+#   company: the value must be empty or the company being loaded
+ACCOUNT_SCHEMA = {
+    "CompanyName": {"company": True},
+    "AccountId": {"required": True, "pattern": r"\d{12}", "unique": True},
+    "AccountType": {
+        "required": True,
+        "choices": [
+            Constant.AccountType.MASTER,
+            Constant.AccountType.LINKED,
+            Constant.AccountType.STANDALONE,
+        ],
+        "max_count": {Constant.AccountType.MASTER: 1},
+    },
+    "AdminRole": {"required": True, "pattern": r"[\w+=,.@-]{1,64}"},
+}
+
+
+class RowValidator:
+    """Validates account rows against a schema, the rows can be streamed through filter()."""
+
+    def __init__(self, schema: dict = None, company_name: str = None):
+        self.company_name = company_name
+        self.checks = compile_schema(schema or ACCOUNT_SCHEMA, company_name)
+        self.rows = 0
+        self.violations = []
+
+    def validate(self, row: dict) -> list:
+        """Returns the errors of the row, an empty list if the row is valid."""
+
+        self.rows += 1
+        row_number = self.rows + FIRST_ROW - 1
+        errors = []
+        for column, check in self.checks:
+            error = check(row.get(column), row_number)
+            if error:
+                errors.append(f"{column}: {error}")
+        if errors:
+            self.violations.append(
+                {"Row": row_number, "AccountId": row.get("AccountId"), "Errors": errors}
+            )
+        return errors
+
+    def filter(self, rows):
+        """Yields the valid rows, invalid rows are kept aside in violations."""
+
+        for row in rows:
+            if not self.validate(row):
+                yield row
+
+    def report(self, s3_url: str = None) -> dict:
+        return {
+            "CompanyName": self.company_name,
+            "File": s3_url,
+            "Rows": self.rows,
+            "InvalidRows": len(self.violations),
+            "Violations": self.violations,
+        }
+
+
+def compile_schema(schema: dict, company_name: str = None) -> list:
+    """Turns the schema into a flat list of (column, check), a check returns an error message or None."""
+
+    checks = []
+    for column, rules in schema.items():
+        if rules.get("required"):
+            checks.append((column, _check_required))
+        if rules.get("pattern"):
+            checks.append((column, _pattern_check(rules["pattern"])))
+        if rules.get("choices"):
+            checks.append((column, _choices_check(rules["choices"])))
+        if rules.get("unique"):
+            checks.append((column, _unique_check()))
+        if rules.get("max_count"):
+            checks.append((column, _max_count_check(rules["max_count"])))
+        if rules.get("company") and company_name:
+            checks.append((column, _choices_check(["", None, company_name])))
+    return checks
+
+
+def _check_required(value, row):
+    if value in ("", None):
+        return "value is required"
+
+
+def _pattern_check(pattern: str):
+    regex = re.compile(pattern)
+
+    def check(value, row):
+        if value not in ("", None) and not regex.fullmatch(str(value)):
+            return f"'{value}' doesn't match {pattern}"
+
+    return check
+
+
+def _choices_check(choices: list):
+    allowed = frozenset(choices)
+
+    def check(value, row):
+        if value not in ("", None) and value not in allowed:
+            return f"'{value}' is not one of {sorted(c for c in choices if c)}"
+
+    return check
+
+
+def _unique_check():
+    seen = {}
+
+    def check(value, row):
+        if value in ("", None):
+            return
+        first_row = seen.setdefault(value, row)
+        if first_row != row:
+            return f"'{value}' is a duplicate of row {first_row}"
+
+    return check
+
+
+def _max_count_check(max_count: dict):
+    counts = dict.fromkeys(max_count, 0)
+
+    def check(value, row):
+        if value in counts:
+            counts[value] += 1
+            if counts[value] > max_count[value]:
+                return f"only {max_count[value]} '{value}' allowed"
+
+    return check
@@ -0,0 +1,85 @@
+"""
+  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+  Licensed under the Apache License, Version 2.0 (the "License").
+  You may not use this file except in compliance with the License.
+  You may obtain a copy of the License at
+
+      http://www.apache.org/licenses/LICENSE-2.0
+
+  Unless required by applicable law or agreed to in writing, software
+  distributed under the License is distributed on an "AS IS" BASIS,
+  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+  See the License for the specific language governing permissions and
+  limitations under the License.
+
+  @author iftikhan
+"""
+
+from unittest import mock
+
+from utils.access_analyzer import (
+    EXPOSED,
+    NEW_ORG_ONLY,
+    UPDATED,
+    classify_findings,
+    get_account_analyzer,
+)
+
+CURRENT_ORG = "o-current"
+NEW_ORG = "o-new"
+
+
+def finding(resource, **condition):
+    return {"resource": resource, "condition": condition}
+
+
+def test_classify_findings():
+    findings = [
+        finding("arn:exposed", **{"aws:PrincipalOrgID": CURRENT_ORG}),
+        finding("arn:updated", **{"aws:PrincipalOrgID": CURRENT_ORG}),
+        finding("arn:updated", **{"aws:PrincipalOrgID": NEW_ORG}),
+        finding("arn:new", **{"aws:PrincipalOrgPaths": f"{NEW_ORG}/r-root/*"}),
+        finding("arn:account", **{"aws:PrincipalAccount": "000000000001"}),
+        finding("arn:none"),
+    ]
+
+    assert classify_findings(findings, CURRENT_ORG, NEW_ORG) == {
+        EXPOSED: ["arn:exposed"],
+        UPDATED: ["arn:updated"],
+        NEW_ORG_ONLY: ["arn:new"],
+    }
+
+
+def test_classify_findings_exposed_takes_precedence():
+    findings = [
+        finding(
+            "arn:mixed",
+            **{
+                "aws:PrincipalOrgID": f"{CURRENT_ORG},{NEW_ORG}",
+                "aws:PrincipalOrgPaths": f"{CURRENT_ORG}/r-root/*",
+            },
+        )
+    ]
+
+    assert classify_findings(findings, CURRENT_ORG, NEW_ORG)[EXPOSED] == ["arn:mixed"]
+
+
+def test_get_account_analyzer_prefers_the_active_one():
+    client = mock.Mock()
+    client.list_analyzers.return_value = {
+        "analyzers": [
+            {"arn": "arn:creating", "status": "CREATING"},
+            {"arn": "arn:active", "status": "ACTIVE"},
+        ]
+    }
+
+    assert get_account_analyzer(client)["arn"] == "arn:active"
+    client.list_analyzers.assert_called_once_with(type="ACCOUNT")
+
+
+def test_get_account_analyzer_without_analyzer():
+    client = mock.Mock()
+    client.list_analyzers.return_value = {"analyzers": []}
+
+    assert get_account_analyzer(client) is None
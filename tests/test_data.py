@@ -0,0 +1,86 @@
+"""
+  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+  Licensed under the Apache License, Version 2.0 (the "License").
+  You may not use this file except in compliance with the License.
+  You may obtain a copy of the License at
+
+      http://www.apache.org/licenses/LICENSE-2.0
+
+  Unless required by applicable law or agreed to in writing, software
+  distributed under the License is distributed on an "AS IS" BASIS,
+  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+  See the License for the specific language governing permissions and
+  limitations under the License.
+
+  @author iftikhan
+"""
+
+from utils import data
+
+
+def test_process_rows_converts_the_columns():
+    rows = list(
+        data.process_rows(
+            ["AccountId", "Migrate", "AccountName"],
+            [[123.0, "TRUE", "dev"], ["000000000456", "", 7.0]],
+        )
+    )
+
+    assert rows == [
+        {
+            "SlackHandle": "",
+            "AccountId": "000000000123",
+            "Migrate": True,
+            "AccountName": "dev",
+        },
+        {
+            "SlackHandle": "",
+            "AccountId": "000000000456",
+            "Migrate": False,
+            "AccountName": "7",
+        },
+    ]
+
+
+def test_process_rows_keeps_the_columns_of_the_file():
+    rows = list(data.process_rows(["AccountId", "SlackHandle"], [["1", "@owner"]]))
+
+    assert rows == [{"AccountId": "000000000001", "SlackHandle": "@owner"}]
+
+
+def test_column_converters():
+    assert data.COLUMN_CONVERTERS["AccountId"]("12") == "000000000012"
+    assert data.COLUMN_CONVERTERS["Migrate"]("true") is True
+    assert data.COLUMN_CONVERTERS["Migrate"](1.0) is True
+    assert data.COLUMN_CONVERTERS["Migrate"](None) is False
+    assert data.to_str(None) == ""
+    assert data.to_str(12.0) == "12"
+
+
+def test_spooled_rows_are_read_back(monkeypatch):
+    # Note: Small enough for the rows to be moved to a file on disk.
+    monkeypatch.setattr(data, "SPOOL_MAX_SIZE", 64)
+    rows = [{"AccountId": f"{index:012}", "Migrate": True} for index in range(10)]
+
+    with data.spool_rows(iter(rows)) as spool:
+        assert spool._rolled
+        assert list(data.iter_spooled_rows(spool)) == rows
+
+
+def test_process_rows_without_converters_returns_strings():
+    rows = list(data.process_rows(["AccountId", "Migrate"], [[1.0, ""]], converters={}))
+
+    # Note: Discovery overrides are read this way to tell blank cells apart.
+    assert rows == [{"SlackHandle": "", "AccountId": "1", "Migrate": ""}]
+
+
+def test_process_record_converts_the_values():
+    record = data.process_record({"AccountId": 5, "Migrate": "1", "Tags": {"a": "b"}})
+
+    assert record == {
+        "AccountId": "000000000005",
+        "Migrate": True,
+        "Tags": '{"a": "b"}',
+        "SlackHandle": "",
+    }
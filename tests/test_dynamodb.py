@@ -0,0 +1,338 @@
+"""
+  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+  Licensed under the Apache License, Version 2.0 (the "License").
+  You may not use this file except in compliance with the License.
+  You may obtain a copy of the License at
+
+      http://www.apache.org/licenses/LICENSE-2.0
+
+  Unless required by applicable law or agreed to in writing, software
+  distributed under the License is distributed on an "AS IS" BASIS,
+  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+  See the License for the specific language governing permissions and
+  limitations under the License.
+
+  @author iftikhan
+"""
+
+from unittest import mock
+
+import pytest
+from botocore.exceptions import ClientError
+
+from utils import dynamodb
+
+
+def scan_pages(pages_by_segment):
+    """Table mock whose scan returns the pages of each segment, following ExclusiveStartKey."""
+
+    def scan(Segment, TotalSegments, ExclusiveStartKey=None, **kwargs):
+        page = ExclusiveStartKey or 0
+        response = {
+            "Items": pages_by_segment[Segment][page],
+            "ConsumedCapacity": {"CapacityUnits": 0.5},
+        }
+        if page + 1 < len(pages_by_segment[Segment]):
+            response["LastEvaluatedKey"] = page + 1
+        return response
+
+    table = mock.Mock()
+    table.scan.side_effect = scan
+    return table
+
+
+def test_parallel_scan_reads_every_segment(monkeypatch):
+    table = scan_pages(
+        {0: [[{"Id": 1}, {"Id": 2}], [{"Id": 3}]], 1: [[]], 2: [[{"Id": 4}]]}
+    )
+    monkeypatch.setattr(dynamodb, "get_db", lambda name: table)
+    stats = {}
+
+    items = list(
+        dynamodb.parallel_scan_items(
+            "table", total_segments=3, projection=["Id"], stats=stats
+        )
+    )
+
+    assert sorted(item["Id"] for item in items) == [1, 2, 3, 4]
+    assert stats == {"Items": 4, "ConsumedCapacity": 2.0, "Segments": 3}
+    assert table.scan.call_args.kwargs["ProjectionExpression"] == "#p0"
+
+
+def test_parallel_scan_raises_the_error_of_a_segment(monkeypatch):
+    table = scan_pages({0: [[{"Id": 1}]], 1: [[{"Id": 2}]]})
+    scan = table.scan.side_effect
+
+    def failing_scan(**kwargs):
+        if kwargs["Segment"] == 1:
+            raise Exception("Segment failed")
+        return scan(**kwargs)
+
+    table.scan.side_effect = failing_scan
+    monkeypatch.setattr(dynamodb, "get_db", lambda name: table)
+
+    with pytest.raises(Exception, match="Segment failed"):
+        list(dynamodb.parallel_scan_items("table", total_segments=2))
+
+
+def test_update_expression_without_version_requires_the_item():
+    update = dynamodb.build_update_expression({"Name": "a"}, set(), None, "CompanyName")
+
+    assert (
+        update["ConditionExpression"]
+        == "attribute_exists(#pk) AND attribute_not_exists(#ver)"
+    )
+    assert update["ExpressionAttributeNames"]["#pk"] == "CompanyName"
+    assert ":ver" not in update["ExpressionAttributeValues"]
+
+
+def test_update_expression_checks_the_stored_version():
+    update = dynamodb.build_update_expression(
+        {"Name": "a"}, {"Error"}, 3, "CompanyName"
+    )
+
+    assert update["ConditionExpression"] == "#ver = :ver"
+    assert update["ExpressionAttributeValues"][":ver"] == 3
+    assert "#pk" not in update["ExpressionAttributeNames"]
+    assert update["UpdateExpression"] == (
+        "SET #ver = if_not_exists(#ver, :zero) + :one, #s0 = :s0 REMOVE #r0"
+    )
+    assert update["ExpressionAttributeNames"]["#s0"] == "Name"
+    assert update["ExpressionAttributeNames"]["#r0"] == "Error"
+
+
+def test_update_expression_writes_empty_values_as_null():
+    update = dynamodb.build_update_expression({"Name": ""}, set(), 1, "CompanyName")
+
+    assert update["ExpressionAttributeValues"][":s0"] is None
+
+
+CONDITIONAL_CHECK_FAILED = ClientError(
+    {"Error": {"Code": "ConditionalCheckFailedException", "Message": "failed"}},
+    "UpdateItem",
+)
+
+
+def tracked_account(**attributes):
+    return dynamodb.track(
+        {"CompanyName": "test", "AccountId": "000000000001", "Version": 1, **attributes}
+    )
+
+
+def updated_table(monkeypatch, current=None, update_errors=()):
+    """Table mock, update_item raises update_errors first and get_item returns current."""
+
+    table = mock.Mock()
+    table.update_item.side_effect = [
+        *update_errors,
+        {"Attributes": {"CompanyName": "test", "AccountId": "000000000001"}},
+    ]
+    table.get_item.return_value = {"Item": current} if current is not None else {}
+    monkeypatch.setattr(dynamodb, "get_db", lambda name: table)
+    return table
+
+
+def test_update_item_writes_only_the_changes(monkeypatch):
+    table = updated_table(monkeypatch)
+    account = tracked_account(Name="a", Error="")
+    account["Name"] = "b"
+
+    dynamodb.update_item("table", account)
+
+    kwargs = table.update_item.call_args.kwargs
+    assert kwargs["Key"] == {"CompanyName": "test", "AccountId": "000000000001"}
+    assert kwargs["ExpressionAttributeValues"][":ver"] == 1
+    # Note: DynamoDB rejects unused attribute names, the partition key is only used without a version.
+    assert set(kwargs["ExpressionAttributeNames"].values()) == {
+        "Version",
+        "Name",
+        "LastUpdatedOn",
+    }
+    assert account.changes() == ({}, set())
+
+
+def test_update_item_without_changes_does_not_write(monkeypatch):
+    table = updated_table(monkeypatch)
+
+    dynamodb.update_item("table", tracked_account(Name="a"))
+
+    table.update_item.assert_not_called()
+
+
+def test_update_item_retries_on_the_new_version(monkeypatch):
+    # Someone else updated another attribute in the meantime
+    table = updated_table(
+        monkeypatch,
+        current={"Name": "a", "Status": "other", "Version": 2},
+        update_errors=[CONDITIONAL_CHECK_FAILED],
+    )
+    account = tracked_account(Name="a")
+    account["Name"] = "b"
+
+    dynamodb.update_item("table", account)
+
+    assert table.update_item.call_count == 2
+    retry = table.update_item.call_args.kwargs
+    assert retry["ExpressionAttributeValues"][":ver"] == 2
+
+
+def test_update_item_raises_on_a_concurrent_update_of_the_same_attribute(
+    monkeypatch,
+):
+    table = updated_table(
+        monkeypatch,
+        current={"Name": "other", "Version": 2},
+        update_errors=[CONDITIONAL_CHECK_FAILED],
+    )
+    account = tracked_account(Name="a")
+    account["Name"] = "b"
+
+    with pytest.raises(ClientError):
+        dynamodb.update_item("table", account)
+    assert table.update_item.call_count == 1
+
+
+def test_update_item_raises_if_the_item_was_deleted(monkeypatch):
+    table = updated_table(monkeypatch, update_errors=[CONDITIONAL_CHECK_FAILED])
+    account = tracked_account(Name="a")
+    account["Name"] = "b"
+
+    with pytest.raises(ClientError):
+        dynamodb.update_item("table", account)
+    assert table.update_item.call_count == 1
+
+
+def test_update_item_puts_untracked_items_with_a_version_check(monkeypatch):
+    table = mock.Mock()
+    monkeypatch.setattr(dynamodb, "get_db", lambda name: table)
+
+    dynamodb.update_item("table", {"CompanyName": "test", "AccountId": "1"})
+    dynamodb.update_item(
+        "table", {"CompanyName": "test", "AccountId": "2", "Version": 4}
+    )
+
+    new, existing = [call.kwargs for call in table.put_item.call_args_list]
+    assert new["ConditionExpression"] == "attribute_not_exists(#ver)"
+    assert new["Item"]["Version"] == 1
+    assert existing["ConditionExpression"] == "#ver = :ver"
+    assert existing["ExpressionAttributeValues"] == {":ver": 4}
+    assert existing["Item"]["Version"] == 5
+
+
+def test_update_item_raises_if_an_untracked_item_was_updated(monkeypatch):
+    table = mock.Mock()
+    table.put_item.side_effect = CONDITIONAL_CHECK_FAILED
+    monkeypatch.setattr(dynamodb, "get_db", lambda name: table)
+    item = {"CompanyName": "test", "AccountId": "1", "Version": 4}
+
+    with pytest.raises(ClientError):
+        dynamodb.update_item("table", item)
+    assert item["Version"] == 4
+
+
+def test_convert_empty_values_replaces_nested_empty_strings():
+    value = {"A": "", "B": [{"C": ""}, "x"], "D": {"E": 1}}
+
+    assert dynamodb.convert_empty_values(value) == {
+        "A": None,
+        "B": [{"C": None}, "x"],
+        "D": {"E": 1},
+    }
+    # The input is left as is
+    assert value["A"] == ""
+    assert value["B"][0]["C"] == ""
+
+
+def test_convert_empty_values_keeps_containers_without_empty_strings():
+    value = {"A": "a", "B": [1, 2], "C": {}}
+
+    assert dynamodb.convert_empty_values(value) is value
+    assert dynamodb.convert_empty_values("") is None
+    assert dynamodb.convert_empty_values(0) == 0
+
+
+def test_convert_empty_values_handles_deep_nesting():
+    value = current = {}
+    for _ in range(5000):
+        current["Child"] = {}
+        current = current["Child"]
+    current["Leaf"] = ""
+
+    converted = dynamodb.convert_empty_values(value)
+
+    for _ in range(5000):
+        converted = converted["Child"]
+    assert converted == {"Leaf": None}
+
+
+def batch_writer(monkeypatch, responses):
+    """DynamoDB resource mock, batch_write_item returns or raises responses in order, then writes everything."""
+
+    dynamodb_resource = mock.Mock()
+    responses = iter(responses)
+
+    def batch_write_item(RequestItems):
+        response = next(responses, {})
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    dynamodb_resource.batch_write_item.side_effect = batch_write_item
+    monkeypatch.setattr(dynamodb, "get_resource", lambda name: dynamodb_resource)
+    monkeypatch.setattr(dynamodb.time, "sleep", lambda seconds: None)
+    return dynamodb_resource
+
+
+def items(count):
+    return ({"CompanyName": "test", "AccountId": str(i)} for i in range(count))
+
+
+def test_batch_write_writes_batches_of_25(monkeypatch):
+    dynamodb_resource = batch_writer(monkeypatch, [])
+
+    result = dynamodb.batch_write("table", items(60), workers=2)
+
+    assert result["Written"] == 60
+    assert result["Failed"] == 0
+    sizes = sorted(
+        len(call.kwargs["RequestItems"]["table"])
+        for call in dynamodb_resource.batch_write_item.call_args_list
+    )
+    assert sizes == [10, 25, 25]
+
+
+def test_batch_write_retries_unprocessed_and_throttled_items(monkeypatch):
+    throttled = ClientError(
+        {"Error": {"Code": "ThrottlingException", "Message": "slow down"}},
+        "BatchWriteItem",
+    )
+    unprocessed = {
+        "UnprocessedItems": {"table": [{"PutRequest": {"Item": {"AccountId": "1"}}}]}
+    }
+    batch_writer(monkeypatch, [throttled, unprocessed])
+
+    result = dynamodb.batch_write("table", items(5), workers=1)
+
+    assert result["Written"] == 5
+    assert result["Partitions"][0]["Retries"] == 2
+
+
+def test_batch_write_counts_items_still_unprocessed_as_failed(monkeypatch):
+    unprocessed = {
+        "UnprocessedItems": {"table": [{"PutRequest": {"Item": {"AccountId": "1"}}}]}
+    }
+    batch_writer(monkeypatch, [unprocessed] * dynamodb.BATCH_WRITE_RETRIES)
+
+    result = dynamodb.batch_write("table", items(5), workers=1)
+
+    assert (result["Written"], result["Failed"]) == (4, 1)
+
+
+def test_batch_write_counts_batches_that_raise_as_failed(monkeypatch):
+    # Note: i.e. EndpointConnectionError, the workers must keep draining the queue.
+    batch_writer(monkeypatch, [Exception("Connection lost")] * 10)
+
+    result = dynamodb.batch_write("table", items(250), workers=2)
+
+    assert (result["Written"], result["Failed"]) == (0, 250)
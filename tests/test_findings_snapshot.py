@@ -0,0 +1,64 @@
+"""
+  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+  Licensed under the Apache License, Version 2.0 (the "License").
+  You may not use this file except in compliance with the License.
+  You may obtain a copy of the License at
+
+      http://www.apache.org/licenses/LICENSE-2.0
+
+  Unless required by applicable law or agreed to in writing, software
+  distributed under the License is distributed on an "AS IS" BASIS,
+  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+  See the License for the specific language governing permissions and
+  limitations under the License.
+
+  @author iftikhan
+"""
+
+from datetime import datetime, timedelta, timezone
+
+from utils.findings_snapshot import apply_findings, get_watermark, new_snapshot
+
+NOW = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def finding(finding_id, status="ACTIVE", seconds=0, resource="arn:bucket"):
+    return {
+        "id": finding_id,
+        "status": status,
+        "resource": resource,
+        "condition": {"aws:PrincipalOrgID": "o-current"},
+        "updatedAt": NOW + timedelta(seconds=seconds),
+    }
+
+
+def test_apply_findings_to_a_new_snapshot():
+    snapshot = new_snapshot("arn:analyzer")
+
+    changed = apply_findings(snapshot, [finding("1"), finding("2", seconds=5)])
+
+    assert changed == 2
+    assert set(snapshot["Findings"]) == {"1", "2"}
+    assert get_watermark(snapshot) == NOW + timedelta(seconds=5)
+
+
+def test_apply_findings_removes_resolved_findings():
+    snapshot = new_snapshot("arn:analyzer")
+    apply_findings(snapshot, [finding("1"), finding("2")])
+
+    changed = apply_findings(snapshot, [finding("1", "RESOLVED", seconds=10)])
+
+    assert changed == 1
+    assert set(snapshot["Findings"]) == {"2"}
+    assert get_watermark(snapshot) == NOW + timedelta(seconds=10)
+
+
+def test_apply_findings_at_the_watermark_only_count_if_changed():
+    snapshot = new_snapshot("arn:analyzer")
+    apply_findings(snapshot, [finding("1")])
+
+    assert apply_findings(snapshot, [finding("1")]) == 0
+    assert apply_findings(snapshot, [finding("1", resource="arn:other")]) == 1
+    assert snapshot["Findings"]["1"]["resource"] == "arn:other"
+    assert get_watermark(snapshot) == NOW
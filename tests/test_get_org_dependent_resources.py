@@ -0,0 +1,149 @@
+"""
+  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+  Licensed under the Apache License, Version 2.0 (the "License").
+  You may not use this file except in compliance with the License.
+  You may obtain a copy of the License at
+
+      http://www.apache.org/licenses/LICENSE-2.0
+
+  Unless required by applicable law or agreed to in writing, software
+  distributed under the License is distributed on an "AS IS" BASIS,
+  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+  See the License for the specific language governing permissions and
+  limitations under the License.
+
+  @author iftikhan
+"""
+
+import json
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+
+import pytest
+
+import get_org_dependent_resources as scanner
+
+CURRENT_ORG = "o-current"
+NEW_ORG = "o-new"
+NOW = datetime(2024, 1, 1, tzinfo=timezone.utc)
+ACCOUNT = {"AccountId": "000000000001", "CompanyName": "test", "SlackHandle": ""}
+
+
+def finding(finding_id, resource, status="ACTIVE", seconds=0):
+    return {
+        "id": finding_id,
+        "status": status,
+        "resource": resource,
+        "condition": {"aws:PrincipalOrgID": CURRENT_ORG},
+        "updatedAt": NOW + timedelta(seconds=seconds),
+    }
+
+
+@pytest.fixture
+def region(monkeypatch):
+    """The region's analyzers and findings, and the snapshots and notifications of the scans."""
+
+    region = {
+        "Analyzers": [{"arn": "arn:analyzer", "status": "ACTIVE"}],
+        "Findings": [],
+        "Snapshot": None,
+        "Errors": [],
+        "Fixed": [],
+    }
+
+    def paginate(analyzerArn, filter=None, sort=None):
+        findings = region["Findings"]
+        if filter:
+            findings = [f for f in findings if f["status"] in filter["status"]["eq"]]
+        else:
+            findings = sorted(findings, key=lambda f: f["updatedAt"], reverse=True)
+        return [{"findings": findings}]
+
+    client = mock.Mock()
+    client.list_analyzers.side_effect = lambda type: {"analyzers": region["Analyzers"]}
+    client.get_paginator.return_value.paginate.side_effect = paginate
+    monkeypatch.setattr(scanner, "get_client", lambda *args, **kwargs: client)
+    # Note: Stored as JSON, as in the bucket
+    monkeypatch.setattr(
+        scanner,
+        "get_snapshot",
+        lambda bucket, account_id, region_name: region["Snapshot"]
+        and json.loads(region["Snapshot"]),
+    )
+    monkeypatch.setattr(
+        scanner,
+        "save_snapshot",
+        lambda bucket, account_id, region_name, snapshot: region.update(
+            Snapshot=json.dumps(snapshot)
+        ),
+    )
+    monkeypatch.setattr(
+        scanner,
+        "log_error",
+        lambda msg="", **kwargs: region["Errors"].append(msg),
+    )
+    monkeypatch.setattr(
+        scanner,
+        "notify_fixed_resources",
+        lambda account, region_name, resources: region["Fixed"].extend(resources),
+    )
+    return region
+
+
+def scan():
+    return scanner.get_org_level_resources(
+        "us-east-1", ACCOUNT, None, NEW_ORG, CURRENT_ORG
+    )
+
+
+def test_rescans_only_notify_exposure_changes(region):
+    region["Findings"] = [
+        finding("1", "arn:bucket"),
+        finding("2", "arn:queue", seconds=1),
+    ]
+
+    first = scan()
+
+    assert first["Status"] == "Wait"
+    assert first["Resources"] == ["arn:bucket", "arn:queue"]
+    assert first["NewlyExposed"] == 2
+    assert len(region["Errors"]) == 2
+    assert json.loads(region["Snapshot"])["Exposed"] == ["arn:bucket", "arn:queue"]
+
+    second = scan()
+
+    assert second["Resources"] == ["arn:bucket", "arn:queue"]
+    assert (second["NewlyExposed"], second["NewlyFixed"]) == (0, 0)
+    assert len(region["Errors"]) == 2
+
+    region["Findings"][1] = finding("2", "arn:queue", "RESOLVED", seconds=5)
+    third = scan()
+
+    assert third["Resources"] == ["arn:bucket"]
+    assert (third["NewlyExposed"], third["NewlyFixed"]) == (0, 1)
+    assert region["Fixed"] == ["arn:queue"]
+    assert json.loads(region["Snapshot"])["Exposed"] == ["arn:bucket"]
+
+
+def test_a_region_without_exposed_resources_is_completed(region):
+    region["Findings"] = [finding("1", "arn:bucket", "RESOLVED")]
+
+    result = scan()
+
+    assert result["Status"] == "Completed"
+    assert result["Resources"] == []
+
+
+@pytest.mark.parametrize(
+    "analyzers", [[], [{"arn": "arn:analyzer", "status": "CREATING"}]]
+)
+def test_a_region_without_active_analyzer_waits(region, analyzers):
+    region["Analyzers"] = analyzers
+
+    result = scan()
+
+    assert result["Status"] == "Wait"
+    assert result["Resources"] == []
+    assert region["Errors"] == ["No active Analyzer found in  region us-east-1"]
+    assert region["Snapshot"] is None
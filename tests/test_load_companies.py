@@ -0,0 +1,38 @@
+"""
+  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+  Licensed under the Apache License, Version 2.0 (the "License").
+  You may not use this file except in compliance with the License.
+  You may obtain a copy of the License at
+
+      http://www.apache.org/licenses/LICENSE-2.0
+
+  Unless required by applicable law or agreed to in writing, software
+  distributed under the License is distributed on an "AS IS" BASIS,
+  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+  See the License for the specific language governing permissions and
+  limitations under the License.
+
+  @author iftikhan
+"""
+
+from load_companies import split_by_company
+
+
+def test_split_by_company():
+    sheets = [
+        [
+            {"AccountId": "1"},
+            {"AccountId": "2", "CompanyName": "a"},
+            {"AccountId": "3", "CompanyName": ""},
+            {"AccountId": "4", "CompanyName": "b"},
+        ],
+        [{"AccountId": "5", "CompanyName": "a"}, {"AccountId": "6"}],
+    ]
+
+    companies = split_by_company(sheets)
+
+    assert {
+        company: [account["AccountId"] for account in accounts]
+        for company, accounts in companies.items()
+    } == {"a": ["2", "3", "5", "6"], "b": ["4"]}
@@ -0,0 +1,196 @@
+"""
+  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+  Licensed under the Apache License, Version 2.0 (the "License").
+  You may not use this file except in compliance with the License.
+  You may obtain a copy of the License at
+
+      http://www.apache.org/licenses/LICENSE-2.0
+
+  Unless required by applicable law or agreed to in writing, software
+  distributed under the License is distributed on an "AS IS" BASIS,
+  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+  See the License for the specific language governing permissions and
+  limitations under the License.
+
+  @author iftikhan
+"""
+
+import pytest
+
+import load_data
+
+
+def account(account_id, **columns):
+    return {
+        "AccountId": account_id,
+        "AccountType": "Linked",
+        "AdminRole": "AdminRole",
+        **columns,
+    }
+
+
+@pytest.fixture
+def table(monkeypatch):
+    """Account records by AccountId and the writes of load_accounts."""
+
+    table = {"Records": {}, "Written": [], "Updated": [], "Reads": []}
+
+    def batch_write(table_name, items, is_account_data=False):
+        table["Written"].extend(items)
+        return {"Failed": 0, "Partitions": []}
+
+    monkeypatch.setattr(load_data, "batch_write", batch_write)
+    monkeypatch.setattr(
+        load_data,
+        "update_item",
+        lambda table_name, record: table["Updated"].append(record),
+    )
+    monkeypatch.setattr(
+        load_data,
+        "iter_accounts_by_company_name",
+        lambda company_name, projection: table["Records"].values(),
+    )
+
+    def get_accounts_by_ids(company_name, account_ids):
+        table["Reads"].append(account_ids)
+        return {
+            account_id: dict(table["Records"][account_id])
+            for account_id in account_ids
+            if account_id in table["Records"]
+        }
+
+    monkeypatch.setattr(load_data, "get_accounts_by_ids", get_accounts_by_ids)
+    monkeypatch.setattr(
+        load_data, "report_violations", lambda company_name, s3_url, validator: None
+    )
+    monkeypatch.setattr(load_data, "save_cache", lambda *args: None)
+    return table
+
+
+def test_nothing_is_written_if_the_file_fails_halfway(table, monkeypatch):
+    def rows(s3_url):
+        yield account("000000000001")
+        raise ValueError("Row 2 can't be parsed")
+
+    monkeypatch.setattr(load_data, "iter_account_data", rows)
+
+    with pytest.raises(ValueError):
+        load_data.load_accounts("test", "accounts.csv", {})
+    assert table["Written"] == []
+
+
+def stored(row, company_name="test", **changes):
+    """The record of the row as load_data writes it, with changes applied after hashing."""
+
+    record = dict(row, CompanyName=company_name)
+    record[load_data.CONTENT_HASH] = load_data.content_hash(record)
+    return {**record, **changes}
+
+
+def test_only_new_and_changed_rows_are_written(table):
+    rows = [
+        account("000000000001"),
+        account("000000000002", Migrate=True),
+        account("000000000003"),
+    ]
+    table["Records"] = {
+        "000000000001": stored(rows[0]),
+        "000000000002": stored(account("000000000002", Migrate=False)),
+    }
+    stats = {}
+
+    new = list(
+        load_data.generate_account_updates("test", [dict(row) for row in rows], stats)
+    )
+
+    assert [row["AccountId"] for row in new] == ["000000000003"]
+    assert stats == {"New": 1, "Changed": 1, "Unchanged": 1}
+    assert len(table["Updated"]) == 1
+    assert table["Updated"][0]["AccountId"] == "000000000002"
+    assert table["Updated"][0]["Migrate"] is True
+
+
+def test_account_ids_are_padded_and_the_company_is_set(table):
+    new = list(load_data.generate_account_updates("test", [account("1")]))
+
+    assert new[0]["AccountId"] == "000000000001"
+    assert new[0]["CompanyName"] == "test"
+    assert (
+        new[0][load_data.CONTENT_HASH]
+        == stored(account("000000000001"))[load_data.CONTENT_HASH]
+    )
+
+
+def test_rows_unchanged_in_the_index_are_not_read(table):
+    rows = [
+        account("000000000001"),
+        account("000000000002", Migrate=True),
+        account("000000000003"),
+    ]
+    table["Records"] = {
+        "000000000002": stored(account("000000000002", Migrate=False)),
+        "000000000003": stored(rows[2]),
+    }
+    # Note: 000000000003 was loaded from another file, it's not in the index but has a record.
+    index = {
+        "000000000001": stored(rows[0])[load_data.CONTENT_HASH],
+        "000000000002": table["Records"]["000000000002"][load_data.CONTENT_HASH],
+    }
+    stats = {}
+
+    new = list(
+        load_data.generate_account_updates(
+            "test", [dict(row) for row in rows], stats, existing_hashes=index
+        )
+    )
+
+    assert new == []
+    assert table["Reads"] == [["000000000002", "000000000003"]]
+    assert stats == {"New": 0, "Changed": 1, "Unchanged": 2}
+
+
+def test_an_unchanged_file_is_not_loaded(monkeypatch):
+    version = {"ETag": '"etag"', "VersionId": None}
+    manifest = {"File": "accounts.csv", "LoadedOn": "2024-01-01", **version}
+    monkeypatch.setattr(load_data, "get_file_version", lambda bucket, key: version)
+    monkeypatch.setattr(load_data, "get_manifest", lambda bucket, company: manifest)
+    loads = []
+    monkeypatch.setattr(load_data, "load_accounts", lambda *args: loads.append(args))
+
+    load_data.load_file("test", "accounts.csv")
+    assert loads == []
+
+    load_data.load_file("test", "accounts.csv", force_reload=True)
+    assert loads == [("test", "accounts.csv", version, None, None)]
+
+
+def test_a_multi_company_workbook_is_loaded_per_company(monkeypatch):
+    sheets = [
+        [
+            account("000000000001", CompanyName="test"),
+            account("000000000002"),
+            account("000000000003", CompanyName="other"),
+        ],
+        [account("000000000004", CompanyName="test")],
+    ]
+    version = {"ETag": '"changed"', "VersionId": None}
+    monkeypatch.setattr(load_data, "get_file_version", lambda bucket, key: version)
+    monkeypatch.setattr(load_data, "get_manifest", lambda bucket, company: None)
+    monkeypatch.setattr(load_data, "iter_workbook_sheets", lambda s3_url: sheets)
+    loaded = []
+    monkeypatch.setattr(
+        load_data,
+        "load_accounts",
+        lambda company_name, file_path, file_version, manifest, account_data: loaded.extend(
+            account_data
+        ),
+    )
+
+    load_data.load_file("test", "companies.xls", multi_company=True)
+
+    assert [row["AccountId"] for row in loaded] == [
+        "000000000001",
+        "000000000002",
+        "000000000004",
+    ]
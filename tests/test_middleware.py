@@ -0,0 +1,133 @@
+"""
+  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+  Licensed under the Apache License, Version 2.0 (the "License").
+  You may not use this file except in compliance with the License.
+  You may obtain a copy of the License at
+
+      http://www.apache.org/licenses/LICENSE-2.0
+
+  Unless required by applicable law or agreed to in writing, software
+  distributed under the License is distributed on an "AS IS" BASIS,
+  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+  See the License for the specific language governing permissions and
+  limitations under the License.
+
+  @author iftikhan
+"""
+
+import pytest
+from botocore.exceptions import ClientError
+
+import middleware
+
+ACCESS_DENIED = ClientError(
+    {"Error": {"Code": "AccessDenied", "Message": "denied"}}, "InviteAccount"
+)
+
+
+@pytest.fixture
+def writes(monkeypatch):
+    """Accounts written by the unit of work, the table holds a single account."""
+
+    writes = []
+    monkeypatch.setattr(
+        middleware,
+        "get_account_by_id",
+        lambda table, company_name, account_id: [
+            {"CompanyName": company_name, "AccountId": account_id, "Status": "New"}
+        ],
+    )
+    monkeypatch.setattr(
+        middleware, "update_item", lambda table, item: writes.append(dict(item))
+    )
+    monkeypatch.setattr(
+        middleware, "log_error", lambda msg="", error=None, **kwargs: msg or str(error)
+    )
+    return writes
+
+
+def test_accounts_are_written_once(writes):
+    @middleware.account_handler(error_type="Test")
+    def handler(event, uow):
+        account = uow.get_account("test", "000000000001")
+        account["Status"] = "Joined"
+        assert uow.get_account("test", "000000000001") is account
+        account["Error"] = ""
+        return event
+
+    assert handler({"Status": "Wait"}, None) == {"Status": "Wait"}
+    assert writes == [
+        {
+            "CompanyName": "test",
+            "AccountId": "000000000001",
+            "Status": "Joined",
+            "Error": "",
+        }
+    ]
+
+
+def test_unchanged_accounts_are_not_written(writes):
+    @middleware.account_handler(error_type="Test")
+    def handler(event, uow):
+        uow.get_account("test", "000000000001")
+
+    handler({}, None)
+
+    assert writes == []
+
+
+def test_client_errors_are_stored_with_the_account(writes):
+    @middleware.account_handler(
+        error_type="Test",
+        on_client_error=middleware.set_status("Wait", wrap_data=True),
+        error_msg=middleware.error_code_msg,
+    )
+    def handler(event, uow):
+        uow.get_account("test", "000000000001")
+        raise ACCESS_DENIED
+
+    assert handler({"Data": {"AccountId": "000000000001"}}, None) == {
+        "Data": {"AccountId": "000000000001", "Status": "Wait"}
+    }
+    assert writes[0]["Error"] == "AccessDenied: denied"
+
+
+def test_client_errors_are_raised_without_callback(writes):
+    @middleware.account_handler(error_type="Test")
+    def handler(event, uow):
+        uow.get_account("test", "000000000001")
+        raise ACCESS_DENIED
+
+    with pytest.raises(ClientError):
+        handler({}, None)
+    assert writes[0]["Error"] == str(ACCESS_DENIED)
+
+
+def test_a_failed_write_does_not_hide_the_handler_error(writes, monkeypatch):
+    def update_item(table, item):
+        raise Exception("Write failed")
+
+    monkeypatch.setattr(middleware, "update_item", update_item)
+
+    @middleware.account_handler(error_type="Test")
+    def handler(event, uow):
+        uow.get_account("test", "000000000001")["Status"] = "Joined"
+        raise ValueError("Handler failed")
+
+    with pytest.raises(ValueError, match="Handler failed"):
+        handler({}, None)
+
+
+def test_accounts_are_written_when_the_callback_raises(writes):
+    def wait_for_access(event, error):
+        raise error
+
+    @middleware.account_handler(error_type="Test", on_client_error=wait_for_access)
+    def handler(event, uow):
+        uow.get_account("test", "000000000001")
+        raise ACCESS_DENIED
+
+    with pytest.raises(ClientError):
+        handler({}, None)
+    assert writes[0]["Error"] == str(ACCESS_DENIED)
@@ -0,0 +1,109 @@
+"""
+  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+  Licensed under the Apache License, Version 2.0 (the "License").
+  You may not use this file except in compliance with the License.
+  You may obtain a copy of the License at
+
+      http://www.apache.org/licenses/LICENSE-2.0
+
+  Unless required by applicable law or agreed to in writing, software
+  distributed under the License is distributed on an "AS IS" BASIS,
+  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+  See the License for the specific language governing permissions and
+  limitations under the License.
+
+  @author iftikhan
+"""
+
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+
+import pytest
+
+from utils import sessions
+
+
+def assume_role(expires_in=3600):
+    def call(**kwargs):
+        return {
+            "Credentials": {
+                "AccessKeyId": kwargs["RoleArn"],
+                "SecretAccessKey": "secret",
+                "SessionToken": "token",
+                "Expiration": datetime.now(timezone.utc)
+                + timedelta(seconds=expires_in),
+            }
+        }
+
+    return call
+
+
+def fake_session(access_key="default", expires_in=3600):
+    session = mock.Mock()
+    session.get_credentials.return_value = mock.Mock(access_key=access_key)
+    sts = session.client.return_value
+    sts.assume_role.side_effect = assume_role(expires_in)
+    return session
+
+
+@pytest.fixture(autouse=True)
+def default_session(monkeypatch):
+    sessions.clear_session_cache()
+    session = fake_session()
+    monkeypatch.setattr(sessions, "get_default_session", lambda: session)
+    yield session
+    sessions.clear_session_cache()
+
+
+def test_sessions_are_cached_per_role(default_session):
+    first = sessions.get_session("arn:aws:iam::000000000001:role/Admin")
+    second = sessions.get_session("arn:aws:iam::000000000001:role/Admin")
+    other = sessions.get_session("arn:aws:iam::000000000002:role/Admin")
+
+    assert first is second
+    assert other is not first
+    assert default_session.client.return_value.assume_role.call_count == 2
+
+
+def test_uncached_sessions_always_assume_the_role(default_session):
+    cached = sessions.get_session("arn:aws:iam::000000000001:role/Admin")
+    uncached = sessions.get_session(
+        "arn:aws:iam::000000000001:role/Admin", cached=False
+    )
+
+    assert uncached is not cached
+    assert default_session.client.return_value.assume_role.call_count == 2
+    assert sessions.get_session("arn:aws:iam::000000000001:role/Admin") is cached
+
+
+def test_sessions_are_cached_per_source_identity():
+    role_arn = "arn:aws:iam::000000000001:role/Admin"
+    first = sessions.get_session(role_arn, session=fake_session("master-1"))
+    second = sessions.get_session(role_arn, session=fake_session("master-2"))
+
+    assert first is not second
+
+
+def test_expiring_credentials_are_refreshed(default_session):
+    sts = default_session.client.return_value
+    # Note: Within the mandatory refresh window, the next read of the credentials assumes the role again.
+    sts.assume_role.side_effect = assume_role(expires_in=60)
+
+    role_session = sessions.get_session("arn:aws:iam::000000000001:role/Admin")
+    role_session.get_credentials().get_frozen_credentials()
+
+    assert sts.assume_role.call_count == 2
+
+
+def test_session_pool_reuses_the_master_session(caplog):
+    master_role_arn = "arn:aws:iam::000000000001:role/Admin"
+    first = sessions.session_pool.get_master_session(master_role_arn)
+    second = sessions.session_pool.get_master_session(master_role_arn)
+
+    assert first is second
+    assert sessions.session_pool.stats() == {"Hits": 1, "Misses": 1, "Sessions": 1}
+
+    with caplog.at_level("INFO", logger=sessions.__name__):
+        sessions.session_pool.log_stats()
+    assert "'Hits': 1, 'Misses': 1" in caplog.text
@@ -0,0 +1,67 @@
+"""
+  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+  Licensed under the Apache License, Version 2.0 (the "License").
+  You may not use this file except in compliance with the License.
+  You may obtain a copy of the License at
+
+      http://www.apache.org/licenses/LICENSE-2.0
+
+  Unless required by applicable law or agreed to in writing, software
+  distributed under the License is distributed on an "AS IS" BASIS,
+  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+  See the License for the specific language governing permissions and
+  limitations under the License.
+
+  @author iftikhan
+"""
+
+from validation import RowValidator
+
+
+def account(account_id, account_type="Linked", **columns):
+    return {
+        "CompanyName": "",
+        "AccountId": account_id,
+        "AccountType": account_type,
+        "AdminRole": "AdminRole",
+        **columns,
+    }
+
+
+def test_valid_rows_are_kept():
+    validator = RowValidator(company_name="test")
+    rows = [
+        account("000000000001", "Master", CompanyName="test"),
+        account("000000000002"),
+    ]
+
+    assert list(validator.filter(rows)) == rows
+    assert validator.report()["InvalidRows"] == 0
+
+
+def test_invalid_rows_are_reported():
+    validator = RowValidator(company_name="test")
+    rows = [
+        account("000000000001", "Master"),
+        account("1"),
+        account("000000000001"),
+        account("000000000003", "Master"),
+        account("000000000004", "Other"),
+        account("000000000005", CompanyName="other"),
+        account("000000000006", AdminRole=""),
+    ]
+
+    assert list(validator.filter(rows)) == rows[:1]
+    # Rows are numbered as in a spreadsheet, the header being row 1
+    assert {
+        violation["Row"]: violation["Errors"] for violation in validator.violations
+    } == {
+        3: ["AccountId: '1' doesn't match \\d{12}"],
+        4: ["AccountId: '000000000001' is a duplicate of row 2"],
+        5: ["AccountType: only 1 'Master' allowed"],
+        6: ["AccountType: 'Other' is not one of ['Linked', 'Master', 'Standalone']"],
+        7: ["CompanyName: 'other' is not one of ['test']"],
+        8: ["AdminRole: value is required"],
+    }
+    assert validator.report("s3://bucket/file.csv")["Rows"] == 7